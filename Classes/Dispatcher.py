@@ -0,0 +1,153 @@
+import asyncio
+from collections import deque
+from time import monotonic, perf_counter
+from typing import Deque, Dict, List, Optional, Tuple
+
+import discord
+
+from Classes.Metrics import REGISTRY
+from Classes.Utils import log
+
+REQUEST_SECONDS = REGISTRY.histogram("erp_discord_request_seconds", "Duration of Discord sends and topic edits",
+                                     ("kind",))
+REQUEST_ERRORS = REGISTRY.counter("erp_discord_request_errors_total", "Failed Discord sends and topic edits",
+                                  ("kind",))
+MERGED = REGISTRY.counter("erp_discord_merged_total", "Messages merged into another one before sending")
+
+
+class ChannelQueue:
+    def __init__(self, channel: discord.TextChannel) -> None:
+        self.channel = channel
+        self.messages: Deque[Tuple[Optional[str], Optional[discord.Embed]]] = deque()
+        self.topic: Optional[str] = None  # only the latest requested topic is kept
+        self.sent: Deque[float] = deque()  # monotonic times of recent sends, for the rate limits
+        self.topic_edits: Deque[float] = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+
+def _delay(times: Deque[float], rate: Tuple[int, float]) -> float:
+    """Seconds until one more request fits into `rate` = (requests, per seconds)."""
+    count, window = rate
+    now = monotonic()
+    while times and times[0] <= now - window: times.popleft()
+    if len(times) < count: return 0.0
+    return times[0] + window - now
+
+
+class Dispatcher:
+    """The only place that sends messages or edits topics for the pollers. Callers just queue and return;
+    one task per channel sends them while staying inside the channel's rate limits, merging whatever piled
+    up meanwhile into as few messages as possible."""
+    message_rate = (5, 5.0)  # messages per seconds and channel
+    topic_rate = (2, 600.0)  # topic edits per seconds and channel
+    max_embeds = 10  # Discord limits per message
+    max_embed_chars = 6000
+    max_content = 2000
+    queues: Dict[int, ChannelQueue]
+
+    def __init__(self) -> None:
+        self.queues = dict()
+        self.sent = 0
+        self.merged = 0
+        self.errors = 0
+
+    def queue(self, channel: discord.TextChannel) -> ChannelQueue:
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = ChannelQueue(channel)
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.get_event_loop().create_task(self._run(queue))
+        return queue
+
+    def send(self, channel: discord.TextChannel, content: str = None, embed: discord.Embed = None) -> None:
+        queue = self.queue(channel)
+        queue.messages.append((content, embed))
+        queue.wakeup.set()
+
+    def edit_topic(self, channel: discord.TextChannel, topic: str) -> None:
+        queue = self.queue(channel)
+        queue.topic = topic
+        queue.wakeup.set()
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q.messages) + (q.topic is not None) for q in self.queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self.depth, "sent": self.sent, "merged": self.merged, "errors": self.errors}
+
+    async def flush(self, timeout: float = 10) -> None:
+        """Waits up to `timeout` seconds for the queued messages to go out. Pending topic edits are dropped,
+        they may be rate limited for minutes."""
+        for queue in self.queues.values(): queue.topic = None
+        end = monotonic() + timeout
+        while any(q.messages for q in self.queues.values()) and monotonic() < end:
+            await asyncio.sleep(0.1)
+
+    async def _run(self, queue: ChannelQueue) -> None:
+        while True:
+            if not queue.messages and queue.topic is None:
+                queue.wakeup.clear()
+                await queue.wakeup.wait()
+                continue
+            if queue.messages:
+                delay = _delay(queue.sent, self.message_rate)
+                if delay > 0:
+                    await asyncio.sleep(delay)  # more messages may arrive and get merged meanwhile
+                    continue
+                content, embeds = self._merge(queue.messages)
+                queue.sent.append(monotonic())
+                started = perf_counter()
+                try:
+                    await queue.channel.send(content=content, embeds=embeds)
+                    self.sent += 1
+                    REQUEST_SECONDS.labels("message").observe(perf_counter() - started)
+                except Exception as ex:
+                    self.errors += 1
+                    REQUEST_ERRORS.labels("message").inc()
+                    log(f"[DISCORD] Failed to send to #{queue.channel}: {ex!r}")
+                continue
+            delay = _delay(queue.topic_edits, self.topic_rate)
+            if delay > 0:
+                queue.wakeup.clear()
+                try:
+                    await asyncio.wait_for(queue.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            topic, queue.topic = queue.topic, None
+            queue.topic_edits.append(monotonic())
+            started = perf_counter()
+            try:
+                await queue.channel.edit(topic=topic)
+                self.sent += 1
+                REQUEST_SECONDS.labels("topic").observe(perf_counter() - started)
+            except Exception as ex:
+                self.errors += 1
+                REQUEST_ERRORS.labels("topic").inc()
+                log(f"[DISCORD] Failed to set topic of #{queue.channel}: {ex!r}")
+
+    def _merge(self, messages: Deque[Tuple[Optional[str], Optional[discord.Embed]]]) \
+            -> Tuple[Optional[str], List[discord.Embed]]:
+        contents: List[str] = []
+        embeds: List[discord.Embed] = []
+        length = 0
+        chars = 0
+        while messages:
+            content, embed = messages[0]
+            if contents or embeds:
+                if embed is not None and (len(embeds) >= self.max_embeds or chars + len(embed) > self.max_embed_chars):
+                    break
+                if content and length + len(content) + 1 > self.max_content: break
+                self.merged += 1
+                MERGED.inc()
+            messages.popleft()
+            if content:
+                contents.append(content)
+                length += len(content) + 1
+            if embed is not None:
+                embeds.append(embed)
+                chars += len(embed)
+        content = "\n".join(contents)[:self.max_content]
+        return content or None, embeds
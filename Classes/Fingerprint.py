@@ -0,0 +1,24 @@
+import hashlib
+import json
+from typing import Any
+
+
+def fingerprint_body(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def fingerprint_projection(_json: Any) -> bytes:
+    """Fingerprint of only the fields check_5mserver diffs on, shows in the channel topic or keeps in the
+    history, so pings and lastSeen changing doesn't count as a change."""
+    data = (_json.get("Data") or {}) if isinstance(_json, dict) else {}
+    _vars = data.get("vars") or {}
+    players = data.get("players") or []
+    projection = [
+        data.get("resources"),
+        _vars,
+        sorted((p.get("id") or 0, p.get("name") or "") for p in players if isinstance(p, dict)),
+        len(players),
+        data.get("hostname"),
+        data.get("sv_maxclients"),
+    ]
+    return hashlib.blake2b(json.dumps(projection, separators=(",", ":")).encode(), digest_size=16).digest()
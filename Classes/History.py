@@ -0,0 +1,161 @@
+import json
+import os
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from Classes.Writer import WriteBehind, append_file, truncate_torn_tail
+
+# Scalar Data fields kept in the history, next to vars, resources and players
+FIELDS = ("hostname", "sv_maxclients", "clients", "gametype", "mapname", "server")
+
+
+def project(_json: Any) -> dict:
+    """The part of a servers/single/ response the history keeps. Pings and lastSeen are left out."""
+    data = (_json.get("Data") or {}) if isinstance(_json, dict) else {}
+    return {
+        "f": {k: data.get(k) for k in FIELDS},
+        "v": dict(data.get("vars") or {}),
+        "r": list(data.get("resources") or []),
+        "p": {str(p.get("id")): [p.get("name"), p.get("endpoint"), p.get("identifiers")]
+              for p in data.get("players") or [] if isinstance(p, dict)},
+    }
+
+
+def delta(old: dict, new: dict) -> dict:
+    """What changed from `old` to `new`: j(oined or changed players), l(eft), r+/r- (resources added/removed,
+    or r with the full list if their order changed), v (changed vars), vd (removed vars) and f (fields)."""
+    d: dict = {}
+    joined = {k: v for k, v in new["p"].items() if old["p"].get(k) != v}
+    left = [k for k in old["p"] if k not in new["p"]]
+    if joined: d["j"] = joined
+    if left: d["l"] = left
+    if old["r"] != new["r"]:
+        old_resources, new_resources = set(old["r"]), set(new["r"])
+        added = [r for r in new["r"] if r not in old_resources]
+        removed = [r for r in old["r"] if r not in new_resources]
+        if [r for r in old["r"] if r in new_resources] + added == new["r"]:
+            if added: d["r+"] = added
+            if removed: d["r-"] = removed
+        else:
+            d["r"] = new["r"]
+    changed = {k: v for k, v in new["v"].items() if old["v"].get(k) != v}
+    removed_vars = [k for k in old["v"] if k not in new["v"]]
+    if changed: d["v"] = changed
+    if removed_vars: d["vd"] = removed_vars
+    fields = {k: v for k, v in new["f"].items() if old["f"].get(k) != v}
+    if fields: d["f"] = fields
+    return d
+
+
+def apply(state: dict, d: dict) -> dict:
+    """Applies a delta to `state` in place and returns it."""
+    for k in d.get("l", []): state["p"].pop(k, None)
+    state["p"].update(d.get("j", {}))
+    if "r" in d:
+        state["r"] = list(d["r"])
+    elif "r+" in d or "r-" in d:
+        removed = set(d.get("r-", []))
+        state["r"] = [r for r in state["r"] if r not in removed] + d.get("r+", [])
+    for k in d.get("vd", []): state["v"].pop(k, None)
+    state["v"].update(d.get("v", {}))
+    state["f"].update(d.get("f", {}))
+    return state
+
+
+class ServerHistory:
+    """In-memory bookkeeping for one server's history file."""
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.state: Optional[dict] = None  # last recorded state, None until the first record after a restart
+        self.since_keyframe = 0
+        # A crash can leave the last record torn, which the first append of this run would be glued onto
+        if os.path.isfile(file): truncate_torn_tail(file)
+        self.size = os.path.getsize(file) if os.path.isfile(file) else 0
+        self.keyframes: Optional[List[Tuple[int, int]]] = None  # (timestamp, byte offset), read on first query
+
+
+class SnapshotHistory:
+    """Per-server history of responses in `{directory}/{id}.history.jsonl`. Every `keyframe_every`-th record
+    is a full keyframe, the ones in between are deltas against the previous record, so any point in time is
+    rebuilt from the closest keyframe before it plus at most `keyframe_every` deltas."""
+    servers: Dict[str, ServerHistory]
+
+    def __init__(self, directory: str = "cache/history", keyframe_every: int = 60,
+                 writer: WriteBehind = None) -> None:
+        self.directory = directory
+        self.keyframe_every = keyframe_every
+        self.writer = writer
+        self.servers = dict()
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def server(self, sid: str) -> ServerHistory:
+        history = self.servers.get(sid)
+        if history is None:
+            history = self.servers[sid] = ServerHistory(os.path.join(self.directory, f"{sid}.history.jsonl"))
+        return history
+
+    def record(self, sid: str, _json: Any, timestamp: datetime) -> None:
+        history = self.server(sid)
+        state = project(_json)
+        t = int(timestamp.timestamp())
+        if history.state is None or history.since_keyframe >= self.keyframe_every:
+            record = {"t": t, "k": state}
+            if history.keyframes is not None: history.keyframes.append((t, history.size))
+            history.since_keyframe = 0
+        else:
+            d = delta(history.state, state)
+            if not d: return
+            record = {"t": t, "d": d}
+        history.state = state
+        history.since_keyframe += 1
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        history.size += len(line.encode('utf-8'))
+        if self.writer:
+            self.writer.append(history.file, line)
+        else:
+            append_file(history.file, line)
+
+    def at(self, sid: str, timestamp: datetime) -> Optional[dict]:
+        """The recorded state of the server at `timestamp`, in the shape of `project()`, or None if the
+        history doesn't go back that far."""
+        history = self.server(sid)
+        if self.writer: self.writer.flush()
+        if not os.path.isfile(history.file): return None
+        if history.keyframes is None: history.keyframes = self.index(history.file)
+        t = timestamp.timestamp()
+        i = bisect_right(history.keyframes, (t, float("inf"))) - 1
+        if i < 0: return None
+        state = None
+        with open(history.file, 'rb') as f:
+            f.seek(history.keyframes[i][1])
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn by a crash before it was cut off (see ServerHistory), along with whatever was appended
+                    # to it. The deltas after it are against a state we don't have, so wait for a keyframe.
+                    state = None
+                    continue
+                if record["t"] > t: break
+                if "k" in record:
+                    state = record["k"]  # keyframes written after the index was read aren't in it
+                elif state is not None:
+                    apply(state, record["d"])
+        return state
+
+    @staticmethod
+    def index(file: str) -> List[Tuple[int, int]]:
+        keyframes = list()
+        offset = 0
+        with open(file, 'rb') as f:
+            for line in f:
+                if line.startswith(b'{"t":') and b',"k":' in line[:32]:
+                    try:
+                        keyframes.append((json.loads(line)["t"], offset))
+                    except ValueError:
+                        pass
+                offset += len(line)
+        return keyframes
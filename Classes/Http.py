@@ -0,0 +1,104 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import Optional, Tuple
+
+import aiohttp
+
+from Classes.Utils import log
+
+# Statuses worth another try, anything else is returned to the caller right away
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(limit: int = 100, limit_per_host: int = 16, dns_ttl: int = 300, connect_timeout: float = 5,
+                   read_timeout: float = 15) -> aiohttp.ClientSession:
+    """Session with a bounded connection pool, cached DNS lookups and separate connect and read timeouts
+    instead of one total timeout, so a slow but working response isn't cut off and a dead host fails fast."""
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, ttl_dns_cache=dns_ttl)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half open"
+
+
+@dataclass
+class CircuitBreaker:
+    """Stops polling a server after `threshold` failed polls in a row. Once `cooldown` has passed one probe
+    is let through; if it fails too the breaker opens again for twice as long, up to `max_cooldown`."""
+    threshold: int = 3
+    cooldown: float = 60
+    max_cooldown: float = 1800
+    state: BreakerState = BreakerState.CLOSED
+    failures: int = 0  # consecutive failed polls
+    opened: int = 0  # times opened since the last success, doubles the cooldown each time
+    retry_at: float = 0  # monotonic time the next probe is allowed
+
+    def allow(self) -> bool:
+        if self.state == BreakerState.CLOSED: return True
+        if self.state == BreakerState.OPEN and monotonic() >= self.retry_at:
+            self.state = BreakerState.HALF_OPEN
+            return True
+        return False  # open, or a probe is already in flight
+
+    def success(self) -> None:
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.opened = 0
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.state == BreakerState.HALF_OPEN or self.failures >= self.threshold:
+            self.state = BreakerState.OPEN
+            self.retry_at = monotonic() + min(self.cooldown * 2 ** self.opened, self.max_cooldown)
+            self.opened += 1
+
+    def __str__(self) -> str:
+        if self.state == BreakerState.OPEN:
+            return f"{self.state.value}, probing in {max(0.0, self.retry_at - monotonic()):.0f}s"
+        if self.state == BreakerState.CLOSED and self.failures:
+            return f"{self.state.value}, {self.failures} failure(s)"
+        return self.state.value
+
+
+class Http:
+    """GET with retries and jittered exponential backoff on top of a shared session."""
+
+    def __init__(self, session: aiohttp.ClientSession, retries: int = 2, backoff: float = 0.5,
+                 max_backoff: float = 8) -> None:
+        self.session = session
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = 0
+        self.retried = 0
+
+    def delay(self, attempt: int) -> float:
+        # "Full jitter": anywhere between 0 and the exponential backoff, so retries don't line up
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def get(self, url: str) -> Tuple[int, bytes]:
+        """Status and body of the last attempt. Raises the last exception if no attempt got a response."""
+        error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.delay(attempt - 1))
+            self.requests += 1
+            try:
+                async with self.session.get(url) as response:
+                    log(response, pretty=True, debug=True)
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        log(f"[AIOHTTP] {url} returned HTTP {response.status}, retrying", debug=True)
+                        continue
+                    return response.status, await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                log(f"[AIOHTTP] Requesting {url} failed: {ex!r}", debug=True)
+                error = ex
+        raise error
@@ -0,0 +1,213 @@
+# Counters, gauges and histograms in the Prometheus text format, served over HTTP next to the bot.
+# Metrics are created once at module level and updated in place; children per label value are created on
+# first use, so a server that was never polled doesn't show up.
+
+import bisect
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from Classes.Utils import log
+
+# Seconds, for latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Bytes, for response sizes
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8))  # 1 KiB to 16 MiB
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children: Dict[Labels, object] = dict()
+
+    def labels(self, *values) -> object:
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None: child = self.children[key] = self.child()
+        return child
+
+    def remove(self, *values) -> None:
+        self.children.pop(tuple(str(v) for v in values), None)
+
+    @abstractmethod
+    def child(self) -> object:
+        """A new child for one set of label values."""
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        """The metric's sample lines in the text format."""
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def child(self) -> Value:
+        return Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self.children.items():
+            yield f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    """Set directly, or computed at scrape time by `function`, which returns the value, or a dict of label
+    values to value if the gauge has labels."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 function: Optional[Callable[[], object]] = None) -> None:
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Iterable[str]:
+        if self.function is None:
+            yield from super().samples()
+            return
+        values = self.function()
+        if not isinstance(values, dict): values = {(): values}
+        for key, value in values.items():
+            if not isinstance(key, tuple): key = (key,)
+            yield f"{self.name}{_labels(self.label_names, tuple(str(k) for k in key))} {_number(value)}"
+
+
+class Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def child(self) -> Buckets:
+        return Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self.children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {_number(child.sum)}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {child.count}"
+
+
+class Registry:
+    metrics: List[Metric]
+
+    def __init__(self) -> None:
+        self.metrics = list()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (),
+              function: Optional[Callable[[], object]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def remove(self, label: str, value: str) -> None:
+        """Drops every child whose `label` is `value`, e.g. the series of a server that is no longer tracked."""
+        for metric in self.metrics:
+            if label not in metric.label_names: continue
+            i = metric.label_names.index(label)
+            for key in [k for k in metric.children if k[i] == value]: del metric.children[key]
+
+    def render(self) -> str:
+        out = list()
+        for metric in self.metrics:
+            try:
+                out.append(metric.render())
+            except Exception as ex:
+                log(f"[METRICS] Failed to collect {metric.name}: {ex!r}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+async def serve(registry: Registry, host: str = "127.0.0.1", port: int = 9108) -> web.AppRunner:
+    """Serves `registry` at http://host:port/metrics until the returned runner is cleaned up."""
+    async def metrics(request: web.Request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    application = web.Application()
+    application.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(application, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log(f"[METRICS] Serving on http://{host}:{port}/metrics")
+    return runner
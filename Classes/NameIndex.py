@@ -0,0 +1,102 @@
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Generic, List, Optional, Set, Tuple, TypeVar, Union
+
+from Classes.Utils import sanitize
+
+V = TypeVar("V")
+
+
+def normalize(name: str) -> str:
+    """What names are compared by: without colour codes and case-folded, "^1Foo" and "foo" are the same."""
+    return " ".join(sanitize(name).casefold().split())
+
+
+def pad(key: str) -> str:
+    # Like pg_trgm, so the start of a name weighs more and one or two letters still give trigrams
+    return f"  {key} "
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = pad(key)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def rarest(count: int, threshold: float) -> int:
+    """A name sharing at least `threshold` of a query's `count` trigrams has at least one of this many of the
+    query's rarest trigrams (all but the `threshold` most common ones), so only their postings are read."""
+    return count - max(1, math.ceil(threshold * count)) + 1
+
+
+def score(key: str, wanted: Set[str], name: str, threshold: float) -> Optional[float]:
+    """The share of the query's trigrams `wanted` that `name` has, plus 1 if it contains the query `key`,
+    minus up to 0.1 for trigrams it has extra. None if it has less than `threshold` of them."""
+    have = trigrams(name)
+    shared = len(wanted & have)
+    if shared < threshold * len(wanted): return None
+    return shared / len(wanted) + (key in name) - 0.1 * (1 - shared / len(have))
+
+
+class NameIndex(Generic[V]):
+    """Fuzzy name search over trigrams of the normalized names. Every distinct normalized name gets a number
+    and each trigram a compact array of the numbers of the names containing it; values (the players) are kept
+    per name. Only adding is supported, names are never forgotten by PlayerDB either.
+
+    Only the query's rarest trigram lists are read to find candidates (see rarest()), and the `candidates`
+    that turned up in most of them are then scored exactly."""
+    keys: Dict[str, int]
+    names: List[str]
+    values: List[Union[V, List[V]]]
+    postings: Dict[str, array]
+    candidates = 200
+
+    def __init__(self) -> None:
+        self.keys = dict()
+        self.names = list()
+        self.values = list()
+        self.postings = dict()
+
+    def add(self, name: str, value: V) -> None:
+        key = normalize(name)
+        if not key: return
+        n = self.keys.get(key)
+        if n is None:
+            n = self.keys[key] = len(self.names)
+            self.names.append(key)
+            self.values.append(value)
+            for trigram in trigrams(key):
+                posting = self.postings.get(trigram)
+                if posting is None: posting = self.postings[trigram] = array('I')
+                posting.append(n)
+            return
+        values = self.values[n]
+        if values is value: return  # players by identity, two players can look the same
+        if not isinstance(values, list):
+            self.values[n] = [values, value]
+        elif not any(v is value for v in values):
+            values.append(value)
+
+    def search(self, query: str, limit: int = 10, threshold: float = 0.5) -> List[Tuple[float, str, List[V]]]:
+        """Best matches first as (score, normalized name, values), see score()."""
+        key = normalize(query)
+        if not key: return []
+        wanted = trigrams(key)
+        lists = sorted((self.postings.get(t, ()) for t in wanted), key=len)
+        hits: Counter = Counter()
+        for posting in lists[:rarest(len(wanted), threshold)]:
+            hits.update(posting)
+        results = list()
+        for n, _ in hits.most_common(max(self.candidates, limit)):
+            name = self.names[n]
+            s = score(key, wanted, name, threshold)
+            if s is not None: results.append((s, name, n))
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return [(score, name, self._values(n)) for score, name, n in results[:limit]]
+
+    def _values(self, n: int) -> List[V]:
+        values = self.values[n]
+        return list(values) if isinstance(values, list) else [values]
+
+    def __len__(self) -> int:
+        return len(self.names)
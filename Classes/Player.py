@@ -10,17 +10,22 @@
 #
 #     result = player_from_dict(json.loads(json_string))
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from pprint import pformat
-from typing import Optional, Any, List, TypeVar, Type, Callable, cast
-from datetime import datetime
+from time import perf_counter
+from typing import Optional, Any, Dict, List, Tuple, TypeVar, Type, Callable, Union, cast
+from datetime import datetime, timedelta
+from sys import intern
 import dateutil.parser
 
 
+import gc
 from os import path
 import json
 from Classes.fivem.ServerResponseSingle import Player as ServerPlayer
-from Classes.fivem.ServerResponseSingle import ServerResponseSingle
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle, Data
+from Classes.NameIndex import NameIndex
+from Classes.Writer import WriteBehind, Content, write_file, append_file, truncate_torn_tail
 
 T = TypeVar("T")
 
@@ -49,7 +54,59 @@ def from_union(fs, x):
 
 
 def from_datetime(x: Any) -> datetime:
-    return dateutil.parser.parse(x)
+    # Everything this code writes is isoformat(), which fromisoformat reads far faster than dateutil
+    try:
+        return datetime.fromisoformat(x)
+    except (TypeError, ValueError):
+        return dateutil.parser.parse(x)
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_stamp(x: Optional[datetime]) -> Optional[int]:
+    """Microseconds since 1970 in local time, the way last_seen is kept in memory. Naive datetimes, which is
+    all this code writes, round-trip exactly; aware ones are converted to local time."""
+    if x is None: return None
+    if x.tzinfo is not None: x = x.astimezone().replace(tzinfo=None)
+    return (x - EPOCH) // MICROSECOND
+
+
+def from_stamp(x: Optional[int]) -> Optional[datetime]:
+    return None if x is None else EPOCH + timedelta(microseconds=x)
+
+
+def from_stamp_str(x: Any) -> int:
+    return to_stamp(from_datetime(x))
+
+
+class StampCache:
+    """from_stamp_str, remembering what it parsed. All sightings of one poll share a timestamp, so a DB
+    repeats the same few last_seen strings many times over, and they all end up sharing one int."""
+
+    def __init__(self) -> None:
+        self.parsed: Dict[str, int] = dict()
+
+    def __call__(self, x: Any) -> Optional[int]:
+        if x is None: return None
+        parsed = self.parsed.get(x)
+        if parsed is None: parsed = self.parsed[x] = from_stamp_str(x)
+        return parsed
+
+
+def _str(x: Any) -> Optional[str]:
+    if x is None or isinstance(x, str): return x
+    raise TypeError(x)
+
+
+def _list(x: Any) -> list:
+    if not isinstance(x, list): raise TypeError(x)
+    return x
+
+
+def _intern(x: Optional[str]) -> Optional[str]:
+    return None if x is None else intern(x)
 
 
 def is_type(t: Type[T], x: Any) -> T:
@@ -67,7 +124,33 @@ def to_class(c: Type[T], x: Any) -> dict:
     return cast(Any, x).to_dict()
 
 
-@dataclass
+def slotted(cls: Type[T]) -> Type[T]:
+    """@dataclass(slots=True), which needs Python 3.10. The dataclass is created again with a slot per field
+    and without the class attributes holding the defaults, __init__ has its own copy of those."""
+    cls = dataclass(cls)
+    names = tuple(f.name for f in fields(cls))
+    body = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ("__dict__", "__weakref__")}
+    body["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, body)
+
+
+# The records below are slotted and keep last_seen as an int (see to_stamp) in `seen`, with `last_seen`
+# converting on access. Strings that repeat across records and players (identifiers, names, endpoints,
+# hostnames) are interned, and Server records are shared, see Server.of.
+
+class LastSeen:
+    __slots__ = ()
+
+    @property
+    def last_seen(self) -> Optional[datetime]:
+        return from_stamp(self.seen)
+
+    @last_seen.setter
+    def last_seen(self, value: Optional[datetime]) -> None:
+        self.seen = to_stamp(value)
+
+
+@slotted
 class Character:
     name: Optional[str] = None
     phone: Optional[str] = None
@@ -86,17 +169,20 @@ class Character:
         return result
 
 
-@dataclass
-class Endpoint:
+@slotted
+class Endpoint(LastSeen):
     endpoint: Optional[str] = None
-    last_seen: Optional[datetime] = None
+    seen: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.endpoint = _intern(self.endpoint)
 
     @staticmethod
     def from_dict(obj: Any) -> 'Endpoint':
         assert isinstance(obj, dict)
         endpoint = from_union([from_str, from_none], obj.get("endpoint"))
-        last_seen = from_union([from_datetime, from_none], obj.get("last_seen"))
-        return Endpoint(endpoint, last_seen)
+        seen = from_union([from_stamp_str, from_none], obj.get("last_seen"))
+        return Endpoint(endpoint, seen)
 
     def to_dict(self) -> dict:
         result: dict = {}
@@ -105,30 +191,37 @@ class Endpoint:
         return result
 
 
-@dataclass
-class Identifier:
+@slotted
+class Identifier(LastSeen):
     identifier: Optional[str] = None
-    name: Optional[str] = None
-    value: Optional[str] = None
-    last_seen: Optional[datetime] = None
+    seen: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.identifier = _intern(self.identifier)
+
+    # name and value are split off on access rather than stored, "license" alone would be repeated millions of times
+    @property
+    def name(self) -> str:
+        split = self.identifier.split(":")
+        return split[0] if len(split) > 1 else ""
+
+    @property
+    def value(self) -> str:
+        split = self.identifier.split(":")
+        return split[1] if len(split) > 1 else ""
 
     @staticmethod
     def from_str(identifier: str) -> 'Identifier':
         assert isinstance(identifier, str)
-        split = identifier.split(":")
-        name = split[0] if len(split) > 1 else ""
-        value = split[1] if len(split) > 1 else ""
-        return Identifier(identifier, name, value)
+        return Identifier(identifier)
 
     @staticmethod
     def from_dict(obj: Any) -> 'Identifier':
         assert isinstance(obj, dict)
         identifier = from_union([from_str, from_none], obj.get("identifier"))
-        split = identifier.split(":")
-        name = split[0] if len(split) > 1 else ""
-        value = split[1] if len(split) > 1 else ""
-        last_seen = from_union([from_datetime, from_none], obj.get("last_seen"))
-        return Identifier(identifier, name, value, last_seen)
+        if identifier is None: raise ValueError("identifier missing")
+        seen = from_union([from_stamp_str, from_none], obj.get("last_seen"))
+        return Identifier(identifier, seen)
 
     def to_dict(self) -> dict:
         result: dict = {}
@@ -137,17 +230,20 @@ class Identifier:
         return result
 
 
-@dataclass
-class Name:
+@slotted
+class Name(LastSeen):
     name: Optional[str] = None
-    last_seen: Optional[datetime] = None
+    seen: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.name = _intern(self.name)
 
     @staticmethod
     def from_dict(obj: Any) -> 'Name':
         assert isinstance(obj, dict)
         name = from_union([from_str, from_none], obj.get("name"))
-        last_seen = from_union([from_datetime, from_none], obj.get("last_seen"))
-        return Name(name, last_seen)
+        seen = from_union([from_stamp_str, from_none], obj.get("last_seen"))
+        return Name(name, seen)
 
     def to_dict(self) -> dict:
         result: dict = {}
@@ -156,31 +252,41 @@ class Name:
         return result
 
 
-@dataclass
+@slotted
 class Server:
-    id: Optional[int] = None
-    name: Optional[int] = None
+    id: Optional[str] = None
+    name: Optional[str] = None
+
+    @staticmethod
+    def of(id: Optional[str], name: Optional[str]) -> 'Server':
+        """The shared record for this server, there are only ever a few and every sighting points at one.
+        Don't modify it."""
+        key = (id, name)
+        server = _servers.get(key)
+        if server is None: server = _servers[key] = Server(_intern(id), _intern(name))
+        return server
 
     @staticmethod
     def from_dict(obj: Any) -> 'Server':
         assert isinstance(obj, dict)
-        id = from_union([from_none, lambda x: int(from_str(x))], obj.get("id"))
-        name = from_union([from_none, lambda x: int(from_str(x))], obj.get("name"))
-        return Server(id, name)
+        id = from_union([from_str, from_none], obj.get("id"))
+        name = from_union([from_str, from_none], obj.get("name"))
+        return Server.of(id, name)
 
     def to_dict(self) -> dict:
         result: dict = {}
-        result["id"] = from_union([lambda x: from_none((lambda x: is_type(type(None), x))(x)),
-                                   lambda x: from_str((lambda x: str((lambda x: is_type(int, x))(x)))(x))], self.id)
-        result["name"] = from_union([lambda x: from_none((lambda x: is_type(type(None), x))(x)),
-                                     lambda x: from_str((lambda x: str((lambda x: is_type(int, x))(x)))(x))], self.name)
+        result["id"] = from_union([from_str, from_none], self.id)
+        result["name"] = from_union([from_str, from_none], self.name)
         return result
 
 
-@dataclass
-class SeenOn:
+_servers: Dict[Tuple[Optional[str], Optional[str]], Server] = dict()
+
+
+@slotted
+class SeenOn(LastSeen):
     server: Optional[Server] = None
-    last_seen: Optional[datetime] = None
+    seen: Optional[int] = None
     characters: Optional[List[Character]] = None
     identifiers: Optional[List[Identifier]] = None
     endpoints: Optional[List[Endpoint]] = None
@@ -190,12 +296,12 @@ class SeenOn:
     def from_dict(obj: Any) -> 'SeenOn':
         assert isinstance(obj, dict)
         server = from_union([Server.from_dict, from_none], obj.get("server"))
-        last_seen = from_union([from_datetime, from_none], obj.get("last_seen"))
+        seen = from_union([from_stamp_str, from_none], obj.get("last_seen"))
         characters = from_union([lambda x: from_list(Character.from_dict, x), from_none], obj.get("characters"))
         identifiers = from_union([lambda x: from_list(Identifier.from_dict, x), from_none], obj.get("identifiers"))
         endpoints = from_union([lambda x: from_list(Endpoint.from_dict, x), from_none], obj.get("endpoints"))
         names = from_union([lambda x: from_list(Name.from_dict, x), from_none], obj.get("names"))
-        return SeenOn(server, last_seen, characters, identifiers, endpoints, names)
+        return SeenOn(server, seen, characters, identifiers, endpoints, names)
 
     def to_dict(self) -> dict:
         result: dict = {}
@@ -210,15 +316,45 @@ class SeenOn:
         result["names"] = from_union([lambda x: from_list(lambda x: to_class(Name, x), x), from_none], self.names)
         return result
 
+    @staticmethod
+    def from_ServerPlayer(server: ServerResponseSingle, player: ServerPlayer, now: datetime) -> 'SeenOn':
+        seen = to_stamp(now)
+        _seen_on = SeenOn()
+        _seen_on.server = Server.of(server.end_point, server.data.hostname)
+        _seen_on.seen = seen
+        _seen_on.characters = list()
+        _seen_on.identifiers = list()
+        for _id in player.identifiers:
+            _seen_on.identifiers.append(Identifier(_id, seen))
+        _seen_on.endpoints = list()
+        _seen_on.endpoints.append(Endpoint(player.endpoint, seen))
+        _seen_on.names = list()
+        _seen_on.names.append(Name(player.name, seen))
+        return _seen_on
+
     def update_name(self, name: str, time: datetime):
         for _name in self.names:
             if _name.name == name:
-                name.last_seen = time
+                _name.last_seen = time
                 return
-        self.names.append(Name(name, time))
+        self.names.append(Name(name, to_stamp(time)))
 
+    def update_identifier(self, identifier: str, time: datetime):
+        for _identifier in self.identifiers:
+            if _identifier.identifier == identifier:
+                _identifier.last_seen = time
+                return
+        self.identifiers.append(Identifier(identifier, to_stamp(time)))
 
-@dataclass
+    def update_endpoint(self, endpoint: str, time: datetime):
+        for _endpoint in self.endpoints:
+            if _endpoint.endpoint == endpoint:
+                _endpoint.last_seen = time
+                return
+        self.endpoints.append(Endpoint(endpoint, to_stamp(time)))
+
+
+@slotted
 class Player:
     seen_on: Optional[List[SeenOn]] = None
 
@@ -229,24 +365,10 @@ class Player:
         return Player(seen_on)
 
     @staticmethod
-    def from_ServerPlayer(server: ServerResponseSingle, player: ServerPlayer):
-        now = datetime.now()
-        _seen_on = SeenOn()
-        _seen_on.server = Server(server.end_point, server.data.hostname)
-        _seen_on.last_seen = now
-        _seen_on.characters = list()
-        _seen_on.identifiers = list()
-        for _id in player.identifiers:
-            identifier = Identifier.from_str(_id)
-            identifier.last_seen = now
-            _seen_on.identifiers.append(identifier)
-        _seen_on.endpoints = list()
-        _seen_on.endpoints.append(Endpoint(player.endpoint, now))
-        _seen_on.names = list()
-        _seen_on.names.append(Name(player.name, now))
+    def from_ServerPlayer(server: ServerResponseSingle, player: ServerPlayer, now: datetime = None):
         _player = Player()
         _player.seen_on = list()
-        _player.seen_on.append(_seen_on)
+        _player.seen_on.append(SeenOn.from_ServerPlayer(server, player, now or datetime.now()))
         log(_player, True, True)
         return _player
 
@@ -254,6 +376,9 @@ class Player:
         for seen_on in self.seen_on:
             if seen_on.server.id == sid: return seen_on
 
+    def lastSeenOn(self) -> Optional[SeenOn]:
+        return max(self.seen_on or [], key=lambda s: s.seen or 0, default=None)
+
     def to_dict(self) -> dict:
         result: dict = {}
         result["seen_on"] = from_union([lambda x: from_list(lambda x: to_class(SeenOn, x), x), from_none], self.seen_on)
@@ -267,68 +392,271 @@ def player_from_dict(s: Any) -> Player:
 def player_to_dict(x: Player) -> Any:
     return to_class(Player, x)
 
+
+def _identifier_from_dict(obj: dict, stamp: Callable[[Any], Optional[int]]) -> Identifier:
+    identifier = obj["identifier"]
+    if not isinstance(identifier, str): raise TypeError(identifier)
+    return Identifier(identifier, stamp(obj.get("last_seen")))
+
+
+def _seen_on_from_dict(obj: dict, stamp: Callable[[Any], Optional[int]]) -> SeenOn:
+    server = obj.get("server")
+    characters = obj.get("characters")
+    identifiers = obj.get("identifiers")
+    endpoints = obj.get("endpoints")
+    names = obj.get("names")
+    return SeenOn(
+        None if server is None else Server.of(_str(server.get("id")), _str(server.get("name"))),
+        stamp(obj.get("last_seen")),
+        None if characters is None else
+        [Character(_str(x.get("name")), _str(x.get("phone"))) for x in _list(characters)],
+        None if identifiers is None else [_identifier_from_dict(x, stamp) for x in _list(identifiers)],
+        None if endpoints is None else
+        [Endpoint(_str(x.get("endpoint")), stamp(x.get("last_seen"))) for x in _list(endpoints)],
+        None if names is None else [Name(_str(x.get("name")), stamp(x.get("last_seen"))) for x in _list(names)])
+
+
+def fast_player_from_dict(obj: Any, stamp: Callable[[Any], Optional[int]] = None) -> Player:
+    """player_from_dict without a try/except per field, for loading large DBs. Records that aren't shaped
+    the way PlayerDB writes them go through player_from_dict, so the result is always the same. `stamp`
+    parses last_seen values, pass one StampCache for a whole load."""
+    try:
+        seen_on = obj.get("seen_on")
+        stamp = stamp or StampCache()
+        return Player(None if seen_on is None else [_seen_on_from_dict(x, stamp) for x in _list(seen_on)])
+    except Exception:
+        return player_from_dict(obj)
+
+
+def journal_record(server: ServerResponseSingle, player: ServerPlayer, now: datetime) -> dict:
+    return {"t": now.isoformat(), "s": server.end_point, "h": server.data.hostname,
+            "p": {"endpoint": player.endpoint, "id": player.id, "identifiers": player.identifiers, "name": player.name}}
+
+
+# Index values are the player itself while a key has only one, which is almost always, and a list after
+
+def _add(index: dict, key, player: Player) -> bool:
+    """True if `player` wasn't under `key` yet."""
+    if key is None: return False
+    players = index.get(key)
+    if players is None:
+        index[key] = player
+    elif players is player:
+        return False
+    elif isinstance(players, Player):
+        index[key] = [players, player]
+    elif not any(_player is player for _player in players):
+        players.append(player)
+    else:
+        return False
+    return True
+
+
+def _get(index: dict, key) -> List[Player]:
+    players = index.get(key)
+    if players is None: return []
+    if isinstance(players, Player): return [players]
+    return list(players)
+
+
+def rank_matches(matches: List[Tuple[float, str, List[Player]]], limit: int) -> List[Tuple[float, str, Player]]:
+    """NameIndex matches as (score, normalized name, player), players who share a name most recently seen first."""
+    ranked = list()
+    for score, name, players in matches:
+        players.sort(key=lambda p: getattr(p.lastSeenOn(), "seen", None) or 0, reverse=True)
+        ranked.extend((score, name, player) for player in players)
+    return ranked[:limit]
+
+
 @dataclass
 class PlayerDB:
     file: str
     players: List[Player]
-
-    def __init__(self, file) -> None:
+    # Journaled mode appends every update to `{file}.journal` on save() and only
+    # rewrites the snapshot at `file` once `compact_every` records piled up
+    journaled: bool
+    compact_every: int
+    journal_records: int
+    pending: List[dict]
+    # With a writer, files are written by its worker thread instead of on the caller's
+    writer: Optional[WriteBehind]
+    # Lookup indexes, kept up to date by load() and updatePlayer()
+    by_identifier: Dict[str, Union[Player, List[Player]]]
+    by_name: Dict[str, Union[Player, List[Player]]]
+    by_endpoint: Dict[str, Union[Player, List[Player]]]
+    names: NameIndex[Player]  # fuzzy, see searchNames()
+    load_time: float  # seconds the last load() took, journal replay included
+
+    def __init__(self, file, journaled=False, compact_every=10000, writer: WriteBehind = None) -> None:
         self.players = list()
+        self.writer = writer
+        self.journaled = journaled
+        self.compact_every = compact_every
+        self.journal_records = 0
+        self.pending = list()
+        self.clear_index()
         self.load(file)
 
+    @property
+    def journal_file(self) -> str:
+        return self.file + ".journal"
+
+    def clear_index(self) -> None:
+        self.by_identifier = dict()
+        self.by_name = dict()
+        self.by_endpoint = dict()
+        self.names = NameIndex()
+
+    def index(self, player: Player) -> None:
+        for seen_on in player.seen_on or []:
+            self.index_seen_on(player, seen_on)
+
+    def index_seen_on(self, player: Player, seen_on: SeenOn) -> None:
+        for identifier in seen_on.identifiers or []:
+            _add(self.by_identifier, identifier.identifier, player)
+        for name in seen_on.names or []:
+            if _add(self.by_name, name.name, player): self.names.add(name.name, player)
+        for endpoint in seen_on.endpoints or []:
+            _add(self.by_endpoint, endpoint.endpoint, player)
+
     def load(self, file) -> None:
         self.file = file
+        self.journal_records = 0
+        started = perf_counter()
         if not path.isfile(file) or path.getsize(file) < 1:
             self.players = list()
-            return
-        with open(file, 'r', encoding='utf-8') as f:
-            for player in json.load(f):
-                self.players.append(player_from_dict(player))
-        log(f"Loaded PlayerDB from \"{file}\" with {len(self.players)} players.")
+            self.clear_index()
+        else:
+            stamp = StampCache()
+            # Millions of new objects and no garbage: collecting the young generation every 700 allocations only
+            # rescans them over and over. The threshold is the whole process's, and the load runs next to the
+            # bot, so the collector stays on and only runs less often.
+            threshold = gc.get_threshold()
+            gc.set_threshold(max(threshold[0], 50000), *threshold[1:])
+            try:
+                with open(file, 'r', encoding='utf-8') as f:
+                    for player in json.load(f):
+                        player = fast_player_from_dict(player, stamp)
+                        self.players.append(player)
+                        self.index(player)
+            finally:
+                gc.set_threshold(*threshold)
+            log(f"Loaded PlayerDB from \"{file}\" with {len(self.players)} players.")
+        if path.isfile(self.journal_file): self.replay()
+        self.load_time = perf_counter() - started
+        log(f"PlayerDB loaded in {self.load_time:.2f}s.")
+
+    def replay(self) -> None:
+        # A write torn by a crash is cut off first, the next append would be glued onto it otherwise
+        if truncate_torn_tail(self.journal_file): log(f"Cut off a torn record at the end of \"{self.journal_file}\".")
+        skipped = 0
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1  # a torn record that a later one was appended to, before the above existed
+                    continue
+                server = ServerResponseSingle(record["s"], Data(hostname=record["h"]))
+                try:
+                    self._update(server, ServerPlayer.from_dict(record["p"]), from_datetime(record["t"]))
+                except Exception:
+                    pass
+                self.journal_records += 1
+        log(f"Replayed {self.journal_records} journal records from \"{self.journal_file}\""
+            + (f", skipped {skipped} unreadable lines." if skipped else "."))
 
     def save(self) -> None:
-        with open(self.file, 'w', encoding='utf-8') as f:
-            lst = list()
-            for player in self.players:
-                lst.append(player_to_dict(player))
-            json.dump(lst, f, ensure_ascii=False, indent=4)
+        if self.journaled:
+            self.flush_journal()
+            if self.journal_records >= self.compact_every: self.compact()
+            return
+        self.write(self.file, self.snapshot(indent=4))
+        if path.isfile(self.journal_file): self.write(self.journal_file, "")
         log(f"Saved PlayerDB to \"{self.file}\" with {len(self.players)} players.")
 
+    def flush_journal(self) -> None:
+        if not self.pending: return
+        text = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in self.pending)
+        if self.writer:
+            self.writer.append(self.journal_file, text)
+        else:
+            append_file(self.journal_file, text)
+        self.journal_records += len(self.pending)
+        log(f"Appended {len(self.pending)} records to \"{self.journal_file}\".")
+        self.pending.clear()
+
+    def compact(self) -> None:
+        """Folds the journal into a fresh snapshot. The snapshot is replaced atomically before the journal is
+        truncated, so a crash in between only replays records that are already applied."""
+        self.flush_journal()
+        self.write(self.file, self.snapshot(separators=(",", ":")))
+        self.write(self.journal_file, "")
+        log(f"Compacted {self.journal_records} journal records into \"{self.file}\" ({len(self.players)} players).")
+        self.journal_records = 0
+
+    def snapshot(self, **dumps) -> Callable[[], str]:
+        """The DB as JSON, made when called, which with a writer is on its thread. Only the list of players
+        is copied now; converting the records is most of the work and would stall the event loop. Updates
+        made until the writer gets to it end up in the file too, the next save would write them anyway."""
+        players = list(self.players)
+        return lambda: json.dumps([player_to_dict(player) for player in players], ensure_ascii=False, **dumps)
+
+    def write(self, file: str, content: Content) -> None:
+        if self.writer:
+            self.writer.write(file, content)
+        else:
+            write_file(file, content)
+
+    def __len__(self) -> int:
+        return len(self.players)
+
     def getByName(self, name: str) -> List[Player]:
-        result = list()
-        for player in self.players:
-            for server in player.seen_on:
-                for _name in server.names:
-                    if name == _name: result.append(player)
-        return result
+        return _get(self.by_name, name)
 
     def getByIdentifier(self, name: str, id: str) -> List[Player]:
-        result = list()
-        for player in self.players:
-            for server in player.seen_on:
-                for identifier in server.identifiers:
-                    if identifier.value == id and identifier.name == name: result.append(player)
-        return result
+        return _get(self.by_identifier, f"{name}:{id}")
+
+    def searchNames(self, query: str, limit: int = 10) -> List[Tuple[float, str, Player]]:
+        return rank_matches(self.names.search(query, limit), limit)
 
-    def updatePlayer(self, server: ServerResponseSingle, player: ServerPlayer):
+    def getByEndpoint(self, endpoint: str) -> List[Player]:
+        return _get(self.by_endpoint, endpoint)
+
+    def findPlayers(self, identifiers: List[str]) -> List[Player]:
         found: List[Player] = list()
-        for _player in self.players:
-            for _server in _player.seen_on:
-                for _identifier in _server.identifiers:
-                    for identifier in player.identifiers:
-                        if _identifier.identifier == identifier:
-                            found.append(_player)
+        for identifier in identifiers or []:
+            for player in _get(self.by_identifier, identifier):
+                if not any(player is x for x in found): found.append(player)
+        return found
+
+    def updatePlayer(self, server: ServerResponseSingle, player: ServerPlayer, now: datetime = None):
+        now = now or datetime.now()
+        self._update(server, player, now)
+        if self.journaled: self.pending.append(journal_record(server, player, now))
+
+    def _update(self, server: ServerResponseSingle, player: ServerPlayer, now: datetime):
+        found = self.findPlayers(player.identifiers)
         if len(found) < 1:
-            self.players.append(Player.from_ServerPlayer(server, player))
+            _player = Player.from_ServerPlayer(server, player, now)
+            self.players.append(_player)
+            self.index(_player)
             return
         elif len(found) > 1:
             found_players = ", ".join([x.seen_on[0].names[0].name for x in found])
             raise Exception(f"Found more than one player to update: {found_players}")
-        now = datetime.now()
-        toupdate = found[0].seenOnById(server.end_point)
-        toupdate.update_name(player.name, now)
-        # TODO: Other update methods
-
+        _player = found[0]
+        toupdate = _player.seenOnById(server.end_point)
+        if toupdate is None:
+            toupdate = SeenOn.from_ServerPlayer(server, player, now)
+            _player.seen_on.append(toupdate)
+        else:
+            toupdate.last_seen = now
+            toupdate.update_name(player.name, now)
+            for identifier in player.identifiers or []:
+                toupdate.update_identifier(identifier, now)
+            if player.endpoint: toupdate.update_endpoint(player.endpoint, now)
+        self.index_seen_on(_player, toupdate)
 
 
 def players_from_list(s: Any) -> List[Player]:
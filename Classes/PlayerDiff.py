@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from Classes.Utils import sanitize
+from Classes.fivem.ServerResponseSingle import Player
+
+# Identifier types that stay the same for a player across reconnects, in order of preference
+STABLE_IDENTIFIERS = ("license", "steam", "discord")
+
+Roster = Dict[str, Player]
+
+
+class PlayerEventKind(Enum):
+    JOIN = "join"
+    LEAVE = "leave"
+    RENAME = "rename"
+    ID_CHANGE = "id change"
+
+
+@dataclass
+class PlayerEvent:
+    kind: PlayerEventKind
+    player: Player  # the player as they are now, or were last seen for LEAVE
+    old: Optional[Player] = None  # the previous version for RENAME and ID_CHANGE
+
+
+def player_key(player: Player) -> str:
+    """Key that identifies a player across polls: their first stable identifier, else their server id."""
+    identifiers = player.identifiers or []
+    for kind in STABLE_IDENTIFIERS:
+        prefix = kind + ":"
+        for identifier in identifiers:
+            if identifier.startswith(prefix): return identifier
+    return f"id:{player.id}"
+
+
+def roster_of(players: List[Player]) -> Roster:
+    roster: Roster = dict()
+    for player in players or []:
+        key = player_key(player)
+        if key in roster: key = f"id:{player.id}"
+        roster[key] = player
+    return roster
+
+
+def diff_players(old: Roster, players: List[Player]) -> Tuple[List[PlayerEvent], Roster]:
+    """Matches `players` against the previous roster in one pass. Returns the events and the new roster.
+    Pings aren't compared: they change on most polls and aren't part of the response fingerprint."""
+    events: List[PlayerEvent] = []
+    new = roster_of(players)
+    for key, player in new.items():
+        previous = old.get(key)
+        if previous is None:
+            events.append(PlayerEvent(PlayerEventKind.JOIN, player))
+            continue
+        if previous.id != player.id:
+            events.append(PlayerEvent(PlayerEventKind.ID_CHANGE, player, previous))
+        if previous.name != player.name:
+            events.append(PlayerEvent(PlayerEventKind.RENAME, player, previous))
+    for key, player in old.items():
+        if key not in new: events.append(PlayerEvent(PlayerEventKind.LEAVE, player))
+    return events, new
+
+
+def format_event(event: PlayerEvent) -> str:
+    player, old = event.player, event.old
+    if event.kind == PlayerEventKind.JOIN: return f"+ #{player.id} \"{sanitize(player.name)}\" ({player.ping}ms)"
+    if event.kind == PlayerEventKind.LEAVE: return f"- #{player.id} \"{sanitize(player.name)}\""
+    if event.kind == PlayerEventKind.RENAME:
+        return f"! #{player.id} \"{sanitize(old.name)}\" is now \"{sanitize(player.name)}\""
+    return f"! \"{sanitize(player.name)}\" reconnected #{old.id} -> #{player.id}"
+
+
+def format_events(events: List[PlayerEvent], limit: int = 1024) -> Optional[str]:
+    """Diff block for an embed field of at most `limit` characters."""
+    order = [PlayerEventKind.LEAVE, PlayerEventKind.JOIN, PlayerEventKind.RENAME, PlayerEventKind.ID_CHANGE]
+    shown = sorted(events, key=lambda e: (order.index(e.kind), sanitize(e.player.name or "").lower()))
+    if not shown: return None
+    lines = [format_event(e) for e in shown]
+    budget = limit - len("```diff\n\n```")
+    if sum(len(line) + 1 for line in lines) - 1 > budget:
+        budget -= len(f"\n... and {len(lines)} more")
+        kept, used = [], 0
+        for line in lines:
+            if used + len(line) + 1 > budget: break
+            kept.append(line)
+            used += len(line) + 1
+        lines = kept + [f"... and {len(shown) - len(kept)} more"]
+    return '\n'.join(["```diff"] + lines + ["```"])
+
+
+def getPlayerDiff(old: List[Player], new: List[Player]) -> Optional[str]:
+    return format_events(diff_players(roster_of(old), new)[0])
@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+
+from Classes.Server import Server
+
+
+class IntervalPolicy:
+    """Adapts each server's polling interval to what its recent polls found. Servers whose responses keep
+    changing are polled up to `fastest` times as often as their configured interval, quiet ones up to
+    `slowest` times less often and empty ones `empty` times less often. Failing ones back off exponentially
+    with their breaker's failure count. The result is kept within the server's min_interval and max_interval.
+
+    All servers together stay within `budget` polls per second. Once they would need more, the intervals of
+    the servers that aren't pinned are stretched evenly. The stretch is worked out from the last choice for
+    every server, so it catches up with one more poll of each. Without a budget they get as many polls as
+    their configured intervals add up to, so the busy ones are polled faster only while others are quiet."""
+
+    def __init__(self, budget: Optional[float] = None, smoothing: float = 0.2, fastest: float = 4, slowest: float = 2,
+                 empty: float = 4) -> None:
+        self.budget = budget
+        self.smoothing = smoothing  # weight of the latest poll in Server.activity
+        self.fastest = fastest
+        self.slowest = slowest
+        self.empty = empty
+        self.rates: Dict[str, float] = dict()  # polls per second each server asked for before stretching
+        self.pinned: Dict[str, float] = dict()  # polls per second of the pinned servers
+        self.configured: Dict[str, float] = dict()  # polls per second of each enabled server's configured interval
+        self.wanted = 0.0  # sums of the above, kept up to date instead of summing thousands of servers per poll
+        self.reserved = 0.0
+        self.allowed = 0.0
+        self.players: Dict[str, int] = dict()
+
+    def observe(self, server: Server, error: bool, changed: bool, players: int = None) -> float:
+        """Called after every poll with whether it failed or found changes and, if the response was read, the
+        number of players. Sets and returns the server's next interval."""
+        if players is not None: self.players[server.id] = players
+        if not server.adaptive_interval and not server.activity:
+            # Start out at the configured interval
+            server.activity = (self.slowest - 1) / (self.slowest - 1 / self.fastest)
+        if not error: server.activity += self.smoothing * (changed - server.activity)
+        self._configure(server.id, 0 if server.disabled else 1 / server.interval)
+        if server.pinned_interval or server.pinned or server.disabled:
+            self._rate(server.id, 0)
+            self._pin(server.id, 0 if server.disabled else 1 / server.poll_interval)
+            return server.poll_interval
+        self._pin(server.id, 0)
+        if error:
+            factor = 2 ** min(server.breaker.failures, 10)
+        elif self.players.get(server.id) == 0:
+            factor = self.empty
+        else:
+            # Linear between `slowest` for a server that never changes and 1 / `fastest` for one that always does
+            factor = self.slowest - (self.slowest - 1 / self.fastest) * server.activity
+        wanted = self.clamp(server, server.interval * factor)
+        self._rate(server.id, 1 / wanted)
+        server.adaptive_interval = self.clamp(server, wanted * self.stretch())
+        return server.adaptive_interval
+
+    def stretch(self) -> float:
+        available = (self.budget if self.budget is not None else self.allowed) - self.reserved
+        if available <= 0: return float("inf")  # clamped to max_interval
+        return max(1.0, self.wanted / available)
+
+    def forget(self, sid: str) -> None:
+        self._rate(sid, 0)
+        self._pin(sid, 0)
+        self._configure(sid, 0)
+        self.players.pop(sid, None)
+
+    def _rate(self, sid: str, rate: float) -> None:
+        self.wanted += rate - self.rates.pop(sid, 0.0)
+        if rate: self.rates[sid] = rate
+
+    def _pin(self, sid: str, rate: float) -> None:
+        self.reserved += rate - self.pinned.pop(sid, 0.0)
+        if rate: self.pinned[sid] = rate
+
+    def _configure(self, sid: str, rate: float) -> None:
+        self.allowed += rate - self.configured.pop(sid, 0.0)
+        if rate: self.configured[sid] = rate
+
+    @staticmethod
+    def clamp(server: Server, interval: float) -> float:
+        return min(max(interval, server.min_interval), server.max_interval)
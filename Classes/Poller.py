@@ -0,0 +1,296 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from os import path
+from time import monotonic, perf_counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from Classes.Fingerprint import fingerprint_body, fingerprint_projection
+from Classes.History import SnapshotHistory
+from Classes.Http import Http
+from Classes.PlayerDiff import diff_players, format_events, roster_of
+from Classes.Policy import IntervalPolicy
+from Classes.Replay import Recorder
+from Classes.Server import Server
+from Classes.SnapshotCache import SnapshotCache
+from Classes.TimeSeries import sample_of
+from Classes.Utils import getDiff, log
+from Classes.Writer import WriteBehind
+from Classes.fivem.FastDecoder import fast_server_response_single_from_dict
+from Classes.fivem.LazyDecoder import lazy_server_response_single_from_dict
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle
+from Classes.fivem.ServerStream import decode_server, endpoint_of, iter_frames
+
+API_URL = "https://servers-frontend.fivem.net/api/servers/single/"
+BULK_URL = "https://servers-frontend.fivem.net/api/servers/streamRedir/"
+
+
+def cacheFile(id) -> str:
+    return f"cache/{id}.cache.json"
+
+
+@dataclass
+class PollResult:
+    """What one poll of a server found, reduced to what the Discord side acts on. Small and picklable, so
+    it can be sent from a worker process (see Classes/Worker.py)."""
+    sid: str
+    timestamp: datetime
+    error: Optional[str] = None  # the poll failed, nothing below is set
+    notify: bool = False
+    sample: Optional[Tuple[int, int, List[int]]] = None  # players, capacity and pings; None if the body was unchanged
+    hostname: Optional[str] = None  # set once the response was decoded and diffed, along with the rest
+    players: int = 0
+    capacity: int = 0
+    changes: List[str] = field(default_factory=list)  # what changed, for the message
+    fields: List[Tuple[str, str, bool]] = field(default_factory=list)  # embed fields as (name, value, inline)
+    sightings: List[dict] = field(default_factory=list)  # players to record in the PlayerDB, as ServerPlayer dicts
+    size: int = 0  # bytes received
+    timings: Dict[str, float] = field(default_factory=dict)  # seconds per stage: http, parse, decode, ...
+    interval: float = 0  # seconds until the server's next poll as chosen by the IntervalPolicy, 0 without one
+
+
+Publish = Callable[[Server, PollResult], Awaitable[None]]
+
+
+class Poller:
+    """Fetches, decodes and diffs servers and hands a PollResult per poll to `publish`. Knows nothing about
+    Discord, so it runs the same inside the bot and in worker processes."""
+    http: Optional[Http]
+    recorder: Optional[Recorder] = None  # records every response for tools/replay.py while set
+    policy: Optional[IntervalPolicy] = None  # adapts the servers' polling intervals while set
+    roster_every: float = 300  # seconds between sending every online player to the PlayerDB, see process_response
+
+    def __init__(self, publish: Publish, snapshots: SnapshotCache, history: SnapshotHistory, writer: WriteBehind,
+                 tracked: Callable[[str], bool], lazy: bool = True, api_url: str = API_URL,
+                 bulk_url: str = BULK_URL) -> None:
+        self.publish = publish
+        self.snapshots = snapshots
+        self.history = history
+        self.writer = writer
+        self.tracked = tracked
+        self.lazy = lazy
+        self.api_url = api_url
+        self.bulk_url = bulk_url
+        self.http = None  # set once there is an event loop to create the session on
+
+    async def emit(self, server: Server, result: PollResult) -> None:
+        if self.policy is not None:
+            result.interval = self.policy.observe(server, result.error is not None, bool(result.changes),
+                                                  result.sample[0] if result.sample is not None else None)
+        await self.publish(server, result)
+
+    async def fail(self, server: Server, error: str, timestamp: datetime, notify: bool = False) -> None:
+        await self.emit(server, PollResult(server.id, timestamp, error=error, notify=notify))
+
+    async def on_timeout(self, server: Server) -> None:
+        server.breaker.failure()
+        await self.fail(server, f"Request for \"{server.name}\" ({server.id}) exceeded its {server.deadline}s deadline",
+                        datetime.now())
+
+    async def get_Cache(self, sid: str) -> Optional[ServerResponseSingle]:
+        snapshot = self.snapshots.get(sid)
+        if snapshot is not None: return snapshot
+        # The file on disk is only read to warm up after a restart
+        cfile = cacheFile(sid)
+        if not path.isfile(cfile): return None
+        log(f"Using {cfile}")
+        try:
+            snapshot = self.decode_response(await asyncio.to_thread(self.load_response, cfile))
+            # Decoding is lazy, so read what the diff needs: a file that was cut off or isn't a response must
+            # not become the baseline. Without one this poll starts a fresh one and rewrites the file.
+            data = snapshot.data
+            list(data.resources), roster_of(data.players), data.vars.sv_enforce_game_build
+        except Exception as ex:
+            log(f"Ignoring {cfile}, it isn't a usable response: {ex!r}")
+            return None
+        self.snapshots.put(sid, snapshot, self.tracked(sid))
+        return snapshot
+
+    def decode_response(self, _json) -> ServerResponseSingle:
+        if self.lazy: return lazy_server_response_single_from_dict(_json)
+        return fast_server_response_single_from_dict(_json)
+
+    async def get_Server(self, sid) -> ServerResponseSingle:
+        cfile = cacheFile(sid)
+        url = self.api_url + sid
+        status, body = await self.http.get(url)
+        if status != 200: raise Exception(f"HTTP ERROR {status}")
+        _json = json.loads(body)
+        log(_json, debug=True)
+        self.save_response(_json, cfile)
+        snapshot = self.decode_response(_json)
+        self.snapshots.put(sid, snapshot, self.tracked(sid))
+        return snapshot
+
+    async def check(self, server: Server, now: datetime = None) -> None:
+        now = now or datetime.now()
+        if not server.breaker.allow():
+            log(f"Server \"{server.name}\" ({server.id}) is unreachable, breaker {server.breaker}", debug=True)
+            return
+        try:
+            last_response = await self.get_Cache(server.id)
+            url = self.api_url + server.id
+            log("[AIOHTTP] Requesting " + url)
+            started = perf_counter()
+            status, body = await self.http.get(url)
+            timings = {"http": perf_counter() - started}
+            if self.recorder is not None: self.recorder.record(server.id, now, status, body)
+            if status != 200:
+                server.breaker.failure()
+                await self.fail(server,
+                                f"Failed to request data for \"{server.name}\" ({server.id}): HTTP ERROR {status}",
+                                now)
+                return
+            server.breaker.success()
+            await self.process_response(server, last_response, body, lambda: json.loads(body), now, timings)
+        except Exception as ex:
+            # Whatever failed, the breaker has to hear of it: allow() may have let this poll through as the
+            # half-open probe, and only success() or failure() ends that
+            server.breaker.failure()
+            await self.fail(server, f"Failed to request data for \"{server.name}\" ({server.id}): {ex.args}", now)
+
+    async def bulk_loop(self, servers: Callable[[], List[Server]], interval: float) -> None:
+        while True:
+            started = monotonic()
+            await self.ingest_stream(servers())
+            await asyncio.sleep(max(0.0, interval - (monotonic() - started)))
+
+    async def ingest_stream(self, servers: List[Server]) -> None:
+        """Reads the bulk server list and hands every tracked server's entry to process_response as soon as
+        it has been received. Entries of other servers are skipped without being decoded."""
+        tracked: Dict[str, Server] = {s.id: s for s in servers if not s.disabled}
+        now = datetime.now()
+        seen = 0
+        log("[AIOHTTP] Requesting " + self.bulk_url)
+        try:
+            async with self.http.session.get(self.bulk_url) as response:
+                if response.status != 200:
+                    log(f"[BULK] Failed to request {self.bulk_url}: HTTP ERROR {response.status}")
+                    return
+                async for frame in iter_frames(response.content.iter_any()):
+                    server = tracked.get(endpoint_of(frame))
+                    if server is None: continue
+                    seen += 1
+                    try:
+                        last_response = await self.get_Cache(server.id)
+                        await self.process_response(server, last_response, frame, lambda: decode_server(frame), now)
+                    except Exception as ex:
+                        await self.fail(server, f"Failed to process data for \"{server.name}\" ({server.id}): "
+                                                f"{ex.args}", now)
+        except Exception as ex:
+            log(f"[BULK] Failed to read {self.bulk_url}: {ex!r}")
+        log(f"[BULK] Updated {seen} of {len(tracked)} tracked servers")
+
+    async def process_response(self, server: Server, last_response: Optional[ServerResponseSingle], body: bytes,
+                               load: Callable[[], Any], now: datetime, timings: Dict[str, float] = None) -> None:
+        """Everything after fetching: fingerprint, record, decode and diff. `body` is the raw response, only
+        fingerprinted; `load` parses it and is skipped if the body didn't change. Each stage's duration is
+        added to `timings` and sent along with the result."""
+        cfile = cacheFile(server.id)
+        timings = dict(timings or {})
+        lap = perf_counter()
+
+        def stage(name: str) -> None:
+            nonlocal lap
+            end = perf_counter()
+            timings[name] = end - lap
+            lap = end
+
+        # Sightings come from player events, so players who stay online would never have last_seen refreshed,
+        # and the ones online when tracking started would only be recorded once they left. So every
+        # `roster_every` seconds, and on the first diff, all of them are recorded, changed or not.
+        roster_due = (server.roster_recorded is None
+                      or (now - server.roster_recorded).total_seconds() >= self.roster_every)
+        body_fingerprint = fingerprint_body(body)
+        stage("fingerprint")
+        if last_response is not None and body_fingerprint == server.body_fingerprint and not roster_due:
+            self.fingerprint_hit(server, now)
+            await self.emit(server, PollResult(server.id, now, size=len(body), timings=timings))
+            return
+        _json = load()
+        log(_json, pretty=False, debug=True)
+        result = PollResult(server.id, now, sample=sample_of(_json), size=len(body), timings=timings)
+        fingerprint = fingerprint_projection(_json)
+        stage("parse")
+        if last_response is not None and fingerprint == server.fingerprint and not roster_due:
+            server.body_fingerprint = body_fingerprint
+            self.fingerprint_hit(server, now)
+            await self.emit(server, result)
+            return
+        server.fingerprint_misses += 1
+        self.save_response(_json, cfile)
+        self.history.record(server.id, _json, now)
+        stage("record")
+        fivem_server = self.decode_response(_json)
+        stage("decode")
+        if last_response is None:
+            # Reading the players checks the response before it becomes the baseline the next diff relies on
+            self.processed(server, fivem_server, body_fingerprint, fingerprint, now,
+                           roster_of(fivem_server.data.players))
+            await self.emit(server, result)
+            return
+        log(fivem_server, pretty=True, debug=True)
+        try:
+            # CHANGES START
+            if fivem_server.data.resources != last_response.data.resources:
+                result.fields.append(("Resources", getDiff(last_response.data.resources, fivem_server.data.resources)
+                                      .replace("%20", " "), True))
+                result.changes.append("resources")
+            if fivem_server.data.vars.sv_enforce_game_build != last_response.data.vars.sv_enforce_game_build:
+                result.fields.append(("Game Version", f"```diff\n-{last_response.data.vars.sv_enforce_game_build}\n"
+                                                      f"+{fivem_server.data.vars.sv_enforce_game_build}```", True))
+                result.changes.append("game version")
+            events, roster = diff_players(server.roster or roster_of(last_response.data.players),
+                                          fivem_server.data.players)
+            players = format_events(events)
+            if players:
+                result.fields.append(("Players", players, False))
+                result.changes.append("players")
+            # CHANGES END
+        except Exception:
+            # Either response may be the odd one, and a bad snapshot would fail every diff after it. Without
+            # one the next poll starts over from the response just saved, and from that the next one.
+            self.snapshots.forget(server.id)
+            server.roster = dict()
+            raise
+        stage("diff")
+        seen = [e.player for e in events] if result.changes else []
+        if roster_due:
+            listed = {id(player) for player in seen}
+            seen += [player for player in fivem_server.data.players if id(player) not in listed]
+        result.sightings = [{"endpoint": p.endpoint, "id": p.id, "identifiers": p.identifiers, "name": p.name}
+                            for p in seen]
+        result.hostname = fivem_server.data.hostname
+        result.players = len(fivem_server.data.players)
+        result.capacity = fivem_server.data.sv_maxclients
+        self.processed(server, fivem_server, body_fingerprint, fingerprint, now, roster, roster_due)
+        await self.emit(server, result)
+
+    def processed(self, server: Server, snapshot: ServerResponseSingle, body_fingerprint: bytes, fingerprint: bytes,
+                  now: datetime, roster: dict, roster_recorded: bool = False) -> None:
+        """Remembers a response once it went through everything. Not before: a response that failed halfway
+        would match its fingerprints when it comes again and never be processed, and its player events would
+        be lost with the roster already moved on."""
+        self.snapshots.put(server.id, snapshot, self.tracked(server.id))
+        server.body_fingerprint = body_fingerprint
+        server.fingerprint = fingerprint
+        server.roster = roster
+        if roster_recorded: server.roster_recorded = now
+        server.last_poll = now
+
+    def fingerprint_hit(self, server: Server, now: datetime) -> None:
+        log(f"No changes for \"{server.name}\" ({server.id})", debug=True)
+        server.fingerprint_hits += 1
+        server.last_poll = now
+
+    def load_response(self, filename):
+        if not path.isfile(filename):
+            self.save_response({}, filename)
+            return {}
+        with open(filename, 'r', encoding='utf-8') as f:
+            _json = json.load(f)
+        return _json
+
+    def save_response(self, _json, filename):
+        self.writer.write(filename, lambda: json.dumps(_json, ensure_ascii=False, indent=4))
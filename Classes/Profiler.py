@@ -0,0 +1,145 @@
+# On-demand profiling for !profile: a sampling CPU profiler and tracemalloc, both running for a given number of
+# polls and producing a plain text report. Nothing is hooked in while no profile runs.
+
+import concurrent.futures.thread
+import queue
+import selectors
+import sys
+import threading
+import tracemalloc
+from abc import ABC, abstractmethod
+from collections import Counter
+from time import monotonic, perf_counter
+from typing import Optional, Tuple
+
+Location = Tuple[str, int, str]  # file, first line, qualified name
+
+# A thread whose innermost frame is in one of these is parked waiting for work or I/O: the writer and
+# to_thread pools on their queues, the event loop in select(). Sampling them would only bury the busy ones.
+IDLE_FILES = {threading.__file__, queue.__file__, selectors.__file__, concurrent.futures.thread.__file__}
+
+
+def _location(frame) -> Location:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name)
+
+
+def _format(location: Location) -> str:
+    file, line, name = location
+    return f"{name} ({file}:{line})"
+
+
+class Profile(ABC):
+    """Runs from start() until `polls` polls have been published, see tick()."""
+    kind = ""
+
+    def __init__(self, polls: int, top: int = 40) -> None:
+        self.polls = polls
+        self.top = top
+        self.seen = 0
+        self.started = 0.0
+
+    def start(self) -> None:
+        self.started = monotonic()
+
+    def tick(self) -> bool:
+        """Counts a published poll, True once enough have been."""
+        self.seen += 1
+        return self.seen >= self.polls
+
+    @abstractmethod
+    def stop(self) -> str:
+        """Ends the profile and returns its report."""
+
+    def header(self) -> str:
+        return f"{self.kind} profile over {self.seen} polls, {monotonic() - self.started:.1f}s"
+
+
+class CPUProfile(Profile):
+    """Samples the stacks of all threads every `interval` seconds from a background thread, so the profiled
+    code runs unmodified. Reports functions by own samples (the function itself was running) and by total
+    samples (it was anywhere on the stack). Threads that are waiting for work aren't counted, see IDLE_FILES."""
+    kind = "CPU"
+
+    def __init__(self, polls: int, top: int = 40, interval: float = 0.005) -> None:
+        super().__init__(polls, top)
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.own: Counter = Counter()
+        self.total: Counter = Counter()
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.overhead = 0.0
+
+    def start(self) -> None:
+        super().start()
+        self.thread = threading.Thread(target=self._run, name="CPUProfile", daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            started = perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me: continue
+                if frame.f_code.co_filename in IDLE_FILES:
+                    self.idle += 1
+                    continue
+                self.samples += 1
+                self.own[_location(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    location = _location(frame)
+                    if location not in seen:  # recursion counts once per sample
+                        seen.add(location)
+                        self.total[location] += 1
+                    frame = frame.f_back
+            self.overhead += perf_counter() - started
+
+    def stop(self) -> str:
+        self.stopping.set()
+        if self.thread is not None: self.thread.join()
+        samples = max(self.samples, 1)
+        lines = [self.header() + f", {self.samples} samples every {self.interval * 1000:g}ms "
+                                 f"({self.idle} of idle threads left out, {self.overhead:.2f}s spent sampling)", "",
+                 "Own samples", f"{'own%':>7} {'total%':>7}  function"]
+        for location, count in self.own.most_common(self.top):
+            lines.append(f"{count / samples:7.1%} {self.total[location] / samples:7.1%}  {_format(location)}")
+        lines += ["", "Total samples", f"{'total%':>7} {'own%':>7}  function"]
+        for location, count in self.total.most_common(self.top):
+            lines.append(f"{count / samples:7.1%} {self.own[location] / samples:7.1%}  {_format(location)}")
+        return "\n".join(lines) + "\n"
+
+
+class AllocationProfile(Profile):
+    """tracemalloc from start() to stop(): what was allocated meanwhile and is still alive, by line and by
+    call stack for the largest sites, and the peak of traced memory."""
+    kind = "Allocation"
+
+    def __init__(self, polls: int, top: int = 40, frames: int = 16) -> None:
+        super().__init__(polls, top)
+        self.frames = frames
+
+    def start(self) -> None:
+        super().start()
+        tracemalloc.start(self.frames)
+
+    def stop(self) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        lines = [self.header() + f", {current / 2 ** 20:.1f} MiB still allocated, {peak / 2 ** 20:.1f} MiB peak",
+                 "", "By line", f"{'KiB':>10} {'blocks':>8}  line"]
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:10.1f} {stat.count:8}  {frame.filename}:{frame.lineno}")
+        lines += ["", "Largest call stacks"]
+        for stat in snapshot.statistics("traceback")[:5]:
+            lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            lines += ["    " + line for line in stat.traceback.format(most_recent_first=True)]
+        return "\n".join(lines) + "\n"
+
+
+PROFILES = {"cpu": CPUProfile, "memory": AllocationProfile}
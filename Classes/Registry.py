@@ -0,0 +1,100 @@
+import json
+import os
+from dataclasses import fields
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Classes.Server import Server
+
+# Server fields that come from the config file, everything else is runtime state
+CONFIG_FIELDS = ("name", "channel", "disabled", "interval", "jitter", "deadline", "min_interval", "max_interval",
+                 "pinned")
+DEFAULTS = {f.name: f.default for f in fields(Server) if f.name in CONFIG_FIELDS}
+
+Entries = Dict[str, dict]
+
+
+def channel_id(server: Server) -> Optional[int]:
+    """The server's channel id, both before and after on_ready swapped the id for the channel."""
+    return getattr(server.channel, "id", server.channel)
+
+
+class ServerRegistry:
+    """The tracked servers, read from a JSON list of {"id", "channel", optional "name", "disabled",
+    "interval", "jitter", "deadline", "min_interval", "max_interval", "pinned"} and indexed by id and by
+    channel id. Several servers may share a channel. Reloading keeps the Server objects of servers that are
+    still listed, and with them their runtime state (snapshot fingerprints, roster, breaker, !pin)."""
+    servers: List[Server]
+    by_id: Dict[str, Server]
+    by_channel: Dict[int, List[Server]]
+
+    def __init__(self, file: str) -> None:
+        self.file = file
+        self.servers = list()
+        self.by_id = dict()
+        self.by_channel = dict()
+        self.entries: Entries = dict()  # the config entry each server was last set from
+        self.mtime = 0.0
+        self.apply(*self.read())
+
+    def read(self) -> Tuple[Entries, float]:
+        """Parses the file without applying it, raises ValueError if it is invalid."""
+        mtime = os.path.getmtime(self.file)
+        with open(self.file, 'r', encoding='utf-8') as f:
+            _json = json.load(f)
+        if not isinstance(_json, list): raise ValueError(f"\"{self.file}\" must contain a list of servers")
+        entries: Entries = dict()
+        for entry in _json:
+            if not isinstance(entry, dict) or not entry.get("id") or entry.get("channel") is None:
+                raise ValueError(f"Invalid server entry in \"{self.file}\": {entry!r}")
+            sid = str(entry["id"])
+            if sid in entries: raise ValueError(f"Server {sid} is listed twice in \"{self.file}\"")
+            entries[sid] = {k: entry[k] for k in CONFIG_FIELDS if k in entry}
+            entries[sid]["channel"] = int(entry["channel"])
+            entries[sid].setdefault("name", sid)
+        return entries, mtime
+
+    def apply(self, entries: Entries, mtime: float) -> Tuple[List[Server], List[Server], List[Server]]:
+        """Makes the registry match `entries`. Returns the servers that were (added, removed, changed);
+        added and changed ones have their channel set to the id from the file again."""
+        added, changed = list(), list()
+        servers = list()
+        for sid, entry in entries.items():
+            server = self.by_id.get(sid)
+            if server is None:
+                server = Server(sid, entry["name"], "", entry["channel"])
+                added.append(server)
+            elif entry == self.entries.get(sid):
+                servers.append(server)
+                continue
+            else:
+                changed.append(server)
+            for name in CONFIG_FIELDS:
+                setattr(server, name, entry.get(name, DEFAULTS.get(name)))
+            servers.append(server)
+        removed = [server for sid, server in self.by_id.items() if sid not in entries]
+        self.servers[:] = servers  # in place, others hold on to the list
+        self.entries = entries
+        self.mtime = mtime
+        self.by_id = {server.id: server for server in servers}
+        self.by_channel = dict()
+        for server in servers:
+            self.by_channel.setdefault(channel_id(server), list()).append(server)
+        return added, removed, changed
+
+    def changed_on_disk(self) -> bool:
+        return os.path.getmtime(self.file) != self.mtime
+
+    def get(self, sid: str) -> Optional[Server]:
+        return self.by_id.get(sid)
+
+    def in_channel(self, channel: int) -> List[Server]:
+        return self.by_channel.get(channel, [])
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self.by_id
+
+    def __iter__(self) -> Iterator[Server]:
+        return iter(self.servers)
+
+    def __len__(self) -> int:
+        return len(self.servers)
@@ -0,0 +1,62 @@
+# Recordings of raw poll responses, one JSON line per response:
+#
+#     {"t": "2021-06-09T12:00:00.123456", "sid": "ykv8z5", "status": 200, "body": "{\"EndPoint\": ...}"}
+#
+# written by the Poller while MyClient.recordFile is set and fed back by tools/replay.py.
+
+import heapq
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Classes.Utils import log
+from Classes.Writer import WriteBehind
+
+Record = Tuple[datetime, str, int, bytes]  # time, server id, HTTP status, body
+
+
+class Recorder:
+    def __init__(self, file: str, writer: WriteBehind) -> None:
+        self.file = file
+        self.writer = writer
+        self.records = 0
+
+    def record(self, sid: str, timestamp: datetime, status: int, body: bytes) -> None:
+        line = json.dumps({"t": timestamp.isoformat(), "sid": sid, "status": status,
+                           "body": body.decode('utf-8', 'replace')}, ensure_ascii=False, separators=(",", ":"))
+        self.writer.append(self.file, line + "\n")
+        self.records += 1
+
+
+def _read(file: str) -> Iterator[Record]:
+    with open(file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                log(f"[REPLAY] Skipping a torn line in \"{file}\"")
+                continue
+            yield datetime.fromisoformat(record["t"]), record["sid"], record["status"], record["body"].encode('utf-8')
+
+
+def read_recordings(files: List[str]) -> Iterator[Record]:
+    """The records of all `files` in time order, e.g. the per-worker recordings of one run."""
+    return heapq.merge(*[_read(file) for file in files], key=lambda record: record[0])
+
+
+class ReplayHttp:
+    """Stands in for Http while replaying: answers each server's request with the response queued for it."""
+
+    def __init__(self) -> None:
+        self.responses: Dict[str, Tuple[int, bytes]] = dict()
+        self.requests = 0
+        self.retried = 0
+
+    def queue(self, sid: str, status: int, body: bytes) -> None:
+        self.responses[sid] = (status, body)
+
+    async def get(self, url: str) -> Tuple[int, bytes]:
+        self.requests += 1
+        response: Optional[Tuple[int, bytes]] = self.responses.pop(url.rsplit("/", 1)[-1], None)
+        if response is None: raise Exception(f"Nothing recorded for {url}")
+        return response
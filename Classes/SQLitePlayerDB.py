@@ -0,0 +1,297 @@
+import sqlite3
+from collections import Counter
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from Classes.NameIndex import NameIndex, normalize, pad, rarest, score, trigrams
+from Classes.Player import Player, SeenOn, Server, Character, Identifier, Endpoint, Name, PlayerDB, log, \
+    from_stamp_str, rank_matches
+from Classes.fivem.ServerResponseSingle import Player as ServerPlayer
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS seen_on (
+    id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    server_id TEXT,
+    server_name TEXT,
+    last_seen TEXT,
+    UNIQUE (player_id, server_id)
+);
+CREATE TABLE IF NOT EXISTS identifiers (
+    seen_on_id INTEGER NOT NULL REFERENCES seen_on(id),
+    player_id INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    type TEXT,
+    value TEXT,
+    last_seen TEXT,
+    UNIQUE (seen_on_id, identifier)
+);
+CREATE TABLE IF NOT EXISTS names (
+    seen_on_id INTEGER NOT NULL REFERENCES seen_on(id),
+    player_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    last_seen TEXT,
+    UNIQUE (seen_on_id, name)
+);
+CREATE TABLE IF NOT EXISTS endpoints (
+    seen_on_id INTEGER NOT NULL REFERENCES seen_on(id),
+    player_id INTEGER NOT NULL,
+    endpoint TEXT NOT NULL,
+    last_seen TEXT,
+    UNIQUE (seen_on_id, endpoint)
+);
+CREATE TABLE IF NOT EXISTS characters (
+    seen_on_id INTEGER NOT NULL REFERENCES seen_on(id),
+    name TEXT,
+    phone TEXT
+);
+CREATE TABLE IF NOT EXISTS name_keys (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS name_players (
+    key_id INTEGER NOT NULL REFERENCES name_keys(id),
+    player_id INTEGER NOT NULL,
+    UNIQUE (key_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS identifiers_identifier ON identifiers (identifier);
+CREATE INDEX IF NOT EXISTS identifiers_type_value ON identifiers (type, value);
+CREATE INDEX IF NOT EXISTS names_name ON names (name);
+CREATE INDEX IF NOT EXISTS endpoints_endpoint ON endpoints (endpoint);
+CREATE INDEX IF NOT EXISTS identifiers_player ON identifiers (player_id);
+CREATE INDEX IF NOT EXISTS names_player ON names (player_id);
+CREATE INDEX IF NOT EXISTS endpoints_player ON endpoints (player_id);
+CREATE INDEX IF NOT EXISTS characters_seen_on ON characters (seen_on_id);
+"""
+
+# Fuzzy name search, the same as NameIndex but on disk: name_keys holds the normalized names and
+# name_trigrams their padded trigrams, which the trigram tokenizer (SQLite 3.34 and later) splits them into
+# the same way NameIndex does. The table is contentless, the keys are in name_keys under the same rowid.
+TRIGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS name_trigrams USING fts5(key, content='', tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS name_trigram_counts USING fts5vocab(name_trigrams, 'row');
+"""
+
+
+def _iso(x: Optional[datetime]) -> Optional[str]:
+    return x.isoformat() if x else None
+
+
+def _stamp(x: Optional[str]) -> Optional[int]:
+    return from_stamp_str(x) if x else None
+
+
+class SQLitePlayerDB:
+    """PlayerDB stored in SQLite. Nothing is kept in memory; updatePlayer() writes into the open transaction
+    and save() commits it, so one poll is one transaction."""
+    file: str
+    connection: sqlite3.Connection
+    fuzzy: bool  # whether name_trigrams exists, without it searchNames() only finds names containing the query
+
+    def __init__(self, file) -> None:
+        self.load(file)
+
+    def load(self, file) -> None:
+        self.file = file
+        # May be opened on another thread than the one using it, see MyClient.load_players
+        self.connection = sqlite3.connect(file, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_trigrams()
+        if self.connection.execute("SELECT EXISTS (SELECT 1 FROM names) AND NOT EXISTS (SELECT 1 FROM name_players)"
+                                   ).fetchone()[0]:
+            self.index_names()
+        log(f"Opened SQLite PlayerDB \"{file}\" with {len(self)} players.")
+
+    def create_trigrams(self) -> None:
+        c = self.connection
+        created = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'name_trigrams'").fetchone() is None
+        try:
+            c.executescript(TRIGRAM_SCHEMA)
+        except sqlite3.OperationalError as ex:
+            self.fuzzy = False
+            log(f"SQLite {sqlite3.sqlite_version} can't search names by trigrams ({ex}), !player only finds names "
+                f"containing the query.")
+            return
+        self.fuzzy = True
+        if created:
+            # Names kept while the tokenizer was missing
+            c.execute("INSERT INTO name_trigrams (rowid, key) SELECT id, '  ' || key || ' ' FROM name_keys")
+            c.commit()
+
+    def index_names(self) -> None:
+        """Fills the name search tables from `names`, for DBs from before they existed."""
+        started = perf_counter()
+        for name, player_id in self.connection.cursor().execute("SELECT name, player_id FROM names"):
+            self.index_name(name, player_id)
+        self.connection.commit()
+        log(f"Indexed the names of \"{self.file}\" for searching in {perf_counter() - started:.2f}s.")
+
+    def index_name(self, name: str, player_id: int) -> None:
+        key = normalize(name)
+        if not key: return
+        c = self.connection
+        row = c.execute("SELECT id FROM name_keys WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            key_id = c.execute("INSERT INTO name_keys (key) VALUES (?)", (key,)).lastrowid
+            if self.fuzzy: c.execute("INSERT INTO name_trigrams (rowid, key) VALUES (?, ?)", (key_id, pad(key)))
+        else:
+            key_id = row[0]
+        c.execute("INSERT OR IGNORE INTO name_players VALUES (?, ?)", (key_id, player_id))
+
+    def save(self) -> None:
+        if not self.connection.in_transaction: return
+        self.connection.commit()
+        log(f"Saved PlayerDB to \"{self.file}\" with {len(self)} players.")
+
+    def close(self) -> None:
+        self.save()
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def getByName(self, name: str) -> List[Player]:
+        return self._players("SELECT DISTINCT player_id FROM names WHERE name = ?", (name,))
+
+    def searchNames(self, query: str, limit: int = 10, threshold: float = 0.5) -> List[Tuple[float, str, Player]]:
+        """NameIndex.search on the name search tables, with the same candidates and scores."""
+        key = normalize(query)
+        if not key: return []
+        wanted = trigrams(key)
+        c = self.connection
+        candidates = max(NameIndex.candidates, limit)
+        if self.fuzzy:
+            marks = ",".join("?" * len(wanted))
+            counts = dict(c.execute(f"SELECT term, doc FROM name_trigram_counts WHERE term IN ({marks})", list(wanted)))
+            hits: Counter = Counter()
+            for trigram in sorted(wanted, key=lambda t: counts.get(t, 0))[:rarest(len(wanted), threshold)]:
+                if not counts.get(trigram): continue
+                hits.update(row[0] for row in c.execute("SELECT rowid FROM name_trigrams WHERE name_trigrams MATCH ?",
+                                                        ('"' + trigram.replace('"', '""') + '"',)))
+            ids = [key_id for key_id, _ in hits.most_common(candidates)]
+            rows = c.execute(f"SELECT id, key FROM name_keys WHERE id IN ({','.join('?' * len(ids))})", ids)
+        else:
+            rows = c.execute("SELECT id, key FROM name_keys WHERE instr(key, ?) LIMIT ?", (key, candidates))
+        results = list()
+        for key_id, name in rows.fetchall():
+            s = score(key, wanted, name, threshold)
+            if s is not None: results.append((s, name, key_id))
+        results.sort(key=lambda r: (-r[0], r[1]))
+        matches = list()
+        for s, name, key_id in results[:limit]:
+            ids = [row[0] for row in c.execute("SELECT player_id FROM name_players WHERE key_id = ?", (key_id,))]
+            matches.append((s, name, [self._player(i) for i in ids]))
+        return rank_matches(matches, limit)
+
+    def getByIdentifier(self, name: str, id: str) -> List[Player]:
+        return self._players("SELECT DISTINCT player_id FROM identifiers WHERE type = ? AND value = ?", (name, id))
+
+    def getByEndpoint(self, endpoint: str) -> List[Player]:
+        return self._players("SELECT DISTINCT player_id FROM endpoints WHERE endpoint = ?", (endpoint,))
+
+    def findPlayers(self, identifiers: List[str]) -> List[int]:
+        if not identifiers: return []
+        marks = ",".join("?" * len(identifiers))
+        return [row[0] for row in self.connection.execute(
+            f"SELECT DISTINCT player_id FROM identifiers WHERE identifier IN ({marks})", identifiers)]
+
+    def updatePlayer(self, server: ServerResponseSingle, player: ServerPlayer, now: datetime = None):
+        found = self.findPlayers(player.identifiers)
+        if len(found) > 1:
+            found_players = ", ".join(self._name(x) for x in found)
+            raise Exception(f"Found more than one player to update: {found_players}")
+        now = (now or datetime.now()).isoformat()
+        c = self.connection
+        player_id = found[0] if found else c.execute("INSERT INTO players DEFAULT VALUES").lastrowid
+        c.execute("INSERT INTO seen_on (player_id, server_id, server_name, last_seen) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT (player_id, server_id) DO UPDATE SET last_seen = excluded.last_seen",
+                  (player_id, server.end_point, server.data.hostname, now))
+        seen_on_id = c.execute("SELECT id FROM seen_on WHERE player_id = ? AND server_id IS ?",
+                               (player_id, server.end_point)).fetchone()[0]
+        for identifier in player.identifiers or []:
+            _identifier = Identifier.from_str(identifier)
+            c.execute("INSERT INTO identifiers (seen_on_id, player_id, identifier, type, value, last_seen) "
+                      "VALUES (?, ?, ?, ?, ?, ?) "
+                      "ON CONFLICT (seen_on_id, identifier) DO UPDATE SET last_seen = excluded.last_seen",
+                      (seen_on_id, player_id, identifier, _identifier.name, _identifier.value, now))
+        if player.name is not None:
+            c.execute("INSERT INTO names (seen_on_id, player_id, name, last_seen) VALUES (?, ?, ?, ?) "
+                      "ON CONFLICT (seen_on_id, name) DO UPDATE SET last_seen = excluded.last_seen",
+                      (seen_on_id, player_id, player.name, now))
+            self.index_name(player.name, player_id)
+        if player.endpoint is not None:
+            c.execute("INSERT INTO endpoints (seen_on_id, player_id, endpoint, last_seen) VALUES (?, ?, ?, ?) "
+                      "ON CONFLICT (seen_on_id, endpoint) DO UPDATE SET last_seen = excluded.last_seen",
+                      (seen_on_id, player_id, player.endpoint, now))
+
+    def insert(self, player: Player) -> None:
+        """Copies a player record as is, used to migrate a JSON PlayerDB."""
+        c = self.connection
+        player_id = c.execute("INSERT INTO players DEFAULT VALUES").lastrowid
+        for seen_on in player.seen_on or []:
+            server = seen_on.server or Server()
+            seen_on_id = c.execute("INSERT INTO seen_on (player_id, server_id, server_name, last_seen) "
+                                   "VALUES (?, ?, ?, ?)",
+                                   (player_id, server.id, server.name, _iso(seen_on.last_seen))).lastrowid
+            c.executemany("INSERT OR IGNORE INTO identifiers VALUES (?, ?, ?, ?, ?, ?)",
+                          [(seen_on_id, player_id, x.identifier, x.name, x.value, _iso(x.last_seen))
+                           for x in seen_on.identifiers or [] if x.identifier is not None])
+            c.executemany("INSERT OR IGNORE INTO names VALUES (?, ?, ?, ?)",
+                          [(seen_on_id, player_id, x.name, _iso(x.last_seen))
+                           for x in seen_on.names or [] if x.name is not None])
+            for x in seen_on.names or []:
+                if x.name is not None: self.index_name(x.name, player_id)
+            c.executemany("INSERT OR IGNORE INTO endpoints VALUES (?, ?, ?, ?)",
+                          [(seen_on_id, player_id, x.endpoint, _iso(x.last_seen))
+                           for x in seen_on.endpoints or [] if x.endpoint is not None])
+            c.executemany("INSERT INTO characters VALUES (?, ?, ?)",
+                          [(seen_on_id, x.name, x.phone) for x in seen_on.characters or []])
+
+    def migrate(self, db: PlayerDB) -> None:
+        """Copies every player of a JSON PlayerDB in one transaction, so a failed migration leaves nothing
+        behind and can simply be run again."""
+        started = perf_counter()
+        try:
+            for player in db.players:
+                self.insert(player)
+        except Exception:
+            self.connection.rollback()
+            raise
+        self.save()
+        log(f"Migrated {len(db.players)} players from \"{db.file}\" in {perf_counter() - started:.2f}s.")
+
+    def _name(self, player_id: int) -> str:
+        row = self.connection.execute("SELECT name FROM names WHERE player_id = ? LIMIT 1", (player_id,)).fetchone()
+        return row[0] if row else f"#{player_id}"
+
+    def _players(self, query: str, args: tuple) -> List[Player]:
+        return [self._player(row[0]) for row in self.connection.execute(query, args).fetchall()]
+
+    def _player(self, player_id: int) -> Player:
+        c = self.connection
+        seen_on: Dict[int, SeenOn] = dict()
+        for id, server_id, server_name, last_seen in c.execute(
+                "SELECT id, server_id, server_name, last_seen FROM seen_on WHERE player_id = ?", (player_id,)):
+            seen_on[id] = SeenOn(Server.of(server_id, server_name), _stamp(last_seen), [], [], [], [])
+        for seen_on_id, identifier, last_seen in c.execute(
+                "SELECT seen_on_id, identifier, last_seen FROM identifiers WHERE player_id = ?", (player_id,)):
+            seen_on[seen_on_id].identifiers.append(Identifier(identifier, _stamp(last_seen)))
+        for seen_on_id, name, last_seen in c.execute(
+                "SELECT seen_on_id, name, last_seen FROM names WHERE player_id = ?", (player_id,)):
+            seen_on[seen_on_id].names.append(Name(name, _stamp(last_seen)))
+        for seen_on_id, endpoint, last_seen in c.execute(
+                "SELECT seen_on_id, endpoint, last_seen FROM endpoints WHERE player_id = ?", (player_id,)):
+            seen_on[seen_on_id].endpoints.append(Endpoint(endpoint, _stamp(last_seen)))
+        if seen_on:
+            marks = ",".join("?" * len(seen_on))
+            for seen_on_id, name, phone in c.execute(
+                    f"SELECT seen_on_id, name, phone FROM characters WHERE seen_on_id IN ({marks})", list(seen_on)):
+                seen_on[seen_on_id].characters.append(Character(name, phone))
+        return Player(list(seen_on.values()))
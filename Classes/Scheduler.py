@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import random
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from Classes.Server import Server
+from Classes.Utils import log
+
+
+class PollScheduler:
+    """Polls every server on its own interval with at most `concurrency` polls in flight. Each poll is due
+    at its slot plus a random jitter, and the next slot follows the previous one, not the jittered time."""
+    poll: Callable[[Server], Awaitable[None]]
+    on_timeout: Optional[Callable[[Server], Awaitable[None]]]
+    queue: List[Tuple[float, int, Server, float]]  # (due, seq, server, slot)
+    in_flight: Dict[str, asyncio.Task]
+    semaphore: Optional[asyncio.Semaphore]
+    wakeup: Optional[asyncio.Event]
+
+    def __init__(self, poll: Callable[[Server], Awaitable[None]], concurrency: int = 8,
+                 on_timeout: Optional[Callable[[Server], Awaitable[None]]] = None) -> None:
+        self.poll = poll
+        self.on_timeout = on_timeout
+        self.concurrency = concurrency
+        # Created by run() and run_once(), inside the loop they are used in
+        self.semaphore = None
+        self.queue = list()
+        self.in_flight = dict()
+        self.wakeup = None
+        self.seq = 0
+
+    def schedule(self, server: Server, slot: float) -> None:
+        due = slot + random.uniform(0, server.jitter)
+        server.next_poll = due
+        heapq.heappush(self.queue, (due, self.seq, server, slot))
+        self.seq += 1
+        if self.wakeup is not None: self.wakeup.set()
+
+    def reschedule(self, server: Server) -> None:
+        """Polls the server now, after its settings changed. Unless a poll of it is running: a second one
+        would race it, and the running one schedules the next with the new settings once it is done."""
+        if server.id not in self.in_flight: self.schedule(server, monotonic())
+
+    def add(self, servers: List[Server]) -> None:
+        now = monotonic()
+        for server in servers:
+            self.schedule(server, now)
+
+    def remove(self, server: Server) -> None:
+        # Stale heap entries are dropped when they are popped
+        server.next_poll = 0
+
+    def behind(self, server: Server) -> float:
+        """Seconds the server is behind schedule right now, or how late its last poll started."""
+        if server.id in self.in_flight or server.next_poll == 0: return server.lag
+        return max(0.0, monotonic() - server.next_poll)
+
+    def status(self) -> Dict[str, float]:
+        return {server.id: self.behind(server) for _, _, server, _ in self.queue if server.next_poll}
+
+    def _start(self) -> None:
+        if self.semaphore is None: self.semaphore = asyncio.Semaphore(self.concurrency)
+        if self.wakeup is None: self.wakeup = asyncio.Event()
+
+    async def run(self) -> None:
+        self._start()
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            due, _, server, slot = self.queue[0]
+            delay = due - monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.queue)
+            if server.next_poll != due: continue
+            await self.semaphore.acquire()
+            server.lag = monotonic() - due
+            self.in_flight[server.id] = asyncio.create_task(self._poll(server, due, slot))
+
+    async def run_once(self, servers: List[Server]) -> None:
+        self._start()
+
+        async def _run(server: Server):
+            async with self.semaphore:
+                await self._check(server)
+
+        await asyncio.gather(*[_run(s) for s in servers])
+
+    async def _poll(self, server: Server, due: float, slot: float) -> None:
+        try:
+            await self._check(server)
+        finally:
+            self.semaphore.release()
+            self.in_flight.pop(server.id, None)
+            if server.next_poll == due:
+                # Fixed rate, unless the poll overran its slot
+                self.schedule(server, max(slot + server.poll_interval, monotonic()))
+
+    async def _check(self, server: Server) -> None:
+        if server.disabled:
+            log(f"Server \"{server.name}\" ({server.id}) is disabled, skipping...", debug=True)
+            return
+        log(f"Checking server \"{server.name}\" ({server.id}), {server.lag:.1f}s behind schedule")
+        try:
+            await asyncio.wait_for(self.poll(server), server.deadline)
+        except asyncio.TimeoutError:
+            log(f"Server \"{server.name}\" ({server.id}) missed its {server.deadline}s deadline")
+            if self.on_timeout: await self.on_timeout(server)
+        except Exception as ex:
+            log(f"Polling \"{server.name}\" ({server.id}) failed: {ex!r}")
@@ -1,6 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
 from discord import TextChannel
 
+from Classes.Http import CircuitBreaker
+
 
 @dataclass
 class Server:
@@ -8,4 +12,33 @@ class Server:
     name: str
     error: str
     channel: TextChannel
-    disabled: bool = False
\ No newline at end of file
+    disabled: bool = False
+    interval: float = 60  # seconds between polls, adapted to the server's activity unless pinned
+    jitter: float = 5  # random offset added to every poll, spreads servers out
+    deadline: float = 30  # a poll running longer than this is cancelled
+    min_interval: float = 15  # bounds for the adapted interval, see Classes/Policy.py
+    max_interval: float = 600
+    pinned: bool = False  # always poll every `interval` seconds
+    # Runtime state from here on, left out of the repr so that !servers fits a message; !schedule shows it
+    # Set by !pin, overrides the config and the policy until unpinned, 0 if not pinned
+    pinned_interval: float = field(default=0, repr=False)
+    adaptive_interval: float = field(default=0, repr=False)  # the interval the policy chose last, 0 until it did
+    activity: float = field(default=0, repr=False)  # share of recent polls that found changes, smoothed
+    next_poll: float = field(default=0, repr=False)  # monotonic time the next poll is due
+    lag: float = field(default=0, repr=False)  # how late the last poll started, in seconds
+    last_poll: Optional[datetime] = field(default=None, repr=False)  # last successful poll, changed or not
+    body_fingerprint: bytes = field(default=b"", repr=False)  # hash of the last raw response body
+    fingerprint: bytes = field(default=b"", repr=False)  # hash of the diffed fields of the last response
+    fingerprint_hits: int = field(default=0, repr=False)  # polls skipped because nothing we diff on changed
+    fingerprint_misses: int = field(default=0, repr=False)
+    # Stops polling while the server is down
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker, repr=False)
+    roster: dict = field(default_factory=dict, repr=False)  # online players by identity, see PlayerDiff
+    # When all online players were last sent to the PlayerDB
+    roster_recorded: Optional[datetime] = field(default=None, repr=False)
+
+    @property
+    def poll_interval(self) -> float:
+        if self.pinned_interval: return self.pinned_interval
+        if self.pinned or not self.adaptive_interval: return self.interval
+        return self.adaptive_interval
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle
+
+
+class SnapshotCache:
+    """Last decoded response per server id. Tracked servers are always kept, manually queried ones are
+    evicted least recently used first once there are more than `max_manual` of them."""
+    tracked: Dict[str, ServerResponseSingle]
+    manual: "OrderedDict[str, ServerResponseSingle]"
+
+    def __init__(self, max_manual: int = 32) -> None:
+        self.max_manual = max_manual
+        self.tracked = dict()
+        self.manual = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sid: str) -> Optional[ServerResponseSingle]:
+        snapshot = self.tracked.get(sid)
+        if snapshot is None:
+            snapshot = self.manual.get(sid)
+            if snapshot is not None: self.manual.move_to_end(sid)
+        if snapshot is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return snapshot
+
+    def put(self, sid: str, snapshot: ServerResponseSingle, tracked: bool = True) -> None:
+        if tracked:
+            self.manual.pop(sid, None)
+            self.tracked[sid] = snapshot
+            return
+        if sid in self.tracked:
+            self.tracked[sid] = snapshot
+            return
+        self.manual[sid] = snapshot
+        self.manual.move_to_end(sid)
+        while len(self.manual) > self.max_manual:
+            self.manual.popitem(last=False)
+
+    def untrack(self, sid: str) -> None:
+        """For servers that are no longer tracked, their snapshot is kept like a manually queried one."""
+        snapshot = self.tracked.pop(sid, None)
+        if snapshot is not None: self.put(sid, snapshot, tracked=False)
+
+    def forget(self, sid: str) -> None:
+        self.tracked.pop(sid, None)
+        self.manual.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self.tracked) + len(self.manual)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self.tracked or sid in self.manual
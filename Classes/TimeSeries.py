@@ -0,0 +1,174 @@
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+RAW_COLUMNS = (("t", "d"), ("players", "i"), ("capacity", "i"), ("ping_min", "f"), ("ping_avg", "f"),
+               ("ping_max", "f"))
+ROLLUP_COLUMNS = (("t", "d"), ("samples", "i"), ("players_min", "i"), ("players_avg", "f"), ("players_max", "i"),
+                  ("capacity", "i"), ("ping_avg", "f"), ("ping_max", "f"))
+
+
+def sample_of(_json: Any) -> Tuple[int, int, List[int]]:
+    """Player count, capacity and pings of a raw servers/single/ response."""
+    data = (_json.get("Data") or {}) if isinstance(_json, dict) else {}
+    players = data.get("players") or []
+    pings = [p.get("ping") for p in players if isinstance(p, dict)]
+    return len(players), data.get("sv_maxclients") or 0, pings
+
+
+class Ring:
+    """Up to `size` rows stored column-wise in typed arrays, which grow as rows come in so that servers polled
+    for a short while stay small. Once full the oldest row is overwritten. Rows must be appended in time
+    order, which lets `between` bisect on the t column."""
+
+    def __init__(self, size: int, columns: Tuple[Tuple[str, str], ...]) -> None:
+        self.size = size
+        self.names = [name for name, _ in columns]
+        self.columns = {name: array(code) for name, code in columns}
+        self.start = 0
+        self.count = 0
+
+    def append(self, *row) -> None:
+        if self.count < self.size:
+            # Not full yet, so start is still 0 and the row goes at the end
+            for name, value in zip(self.names, row):
+                self.columns[name].append(value)
+            self.count += 1
+            return
+        i = self.start
+        self.start = (self.start + 1) % self.size
+        for name, value in zip(self.names, row):
+            self.columns[name][i] = value
+
+    def time(self, n: int) -> float:
+        return self.columns["t"][(self.start + n) % self.size]
+
+    def first(self) -> Optional[float]:
+        return self.time(0) if self.count else None
+
+    def last(self) -> Optional[tuple]:
+        if not self.count: return None
+        i = (self.start + self.count - 1) % self.size
+        return tuple(self.columns[name][i] for name in self.names)
+
+    def bisect(self, t: float) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def between(self, start: float, end: float) -> Iterator[tuple]:
+        columns = [self.columns[name] for name in self.names]
+        for n in range(self.bisect(start), self.count):
+            i = (self.start + n) % self.size
+            if columns[0][i] > end: return
+            yield tuple(column[i] for column in columns)
+
+
+class Rollup:
+    """Accumulates samples for the bucket currently being filled."""
+
+    def __init__(self, bucket: float) -> None:
+        self.bucket = bucket
+        self.t: Optional[float] = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples = 0
+        self.players_min = 0
+        self.players_sum = 0.0
+        self.players_max = 0
+        self.capacity = 0
+        self.ping_sum = 0.0
+        self.ping_max = 0.0
+
+    def add(self, samples: int, players_min: int, players_sum: float, players_max: int, capacity: int,
+            ping_sum: float, ping_max: float) -> None:
+        self.players_min = players_min if self.samples == 0 else min(self.players_min, players_min)
+        self.samples += samples
+        self.players_sum += players_sum
+        self.players_max = max(self.players_max, players_max)
+        self.capacity = capacity
+        self.ping_sum += ping_sum
+        self.ping_max = max(self.ping_max, ping_max)
+
+    def row(self) -> tuple:
+        return (self.t, self.samples, self.players_min, self.players_sum / self.samples, self.players_max,
+                self.capacity, self.ping_sum / self.samples, self.ping_max)
+
+
+class ServerSeries:
+    """Raw samples plus minute and hour rollups for one server."""
+
+    def __init__(self, raw: int, minutes: int, hours: int) -> None:
+        self.raw = Ring(raw, RAW_COLUMNS)
+        self.minutes = Ring(minutes, ROLLUP_COLUMNS)
+        self.hours = Ring(hours, ROLLUP_COLUMNS)
+        self.minute = Rollup(60)
+        self.hour = Rollup(3600)
+
+    def record(self, t: float, players: int, capacity: int, ping_min: float, ping_avg: float, ping_max: float):
+        self.raw.append(t, players, capacity, ping_min, ping_avg, ping_max)
+        self._roll(self.minute, self.minutes, t, (1, players, players, players, capacity, ping_avg, ping_max))
+
+    def _roll(self, rollup: Rollup, ring: Ring, t: float, sample: tuple) -> None:
+        bucket = t - t % rollup.bucket
+        if rollup.t is not None and bucket != rollup.t and rollup.samples:
+            row = rollup.row()
+            ring.append(*row)
+            if rollup is self.minute:
+                _, samples, players_min, players_avg, players_max, capacity, ping_avg, ping_max = row
+                self._roll(self.hour, self.hours, row[0], (samples, players_min, players_avg * samples,
+                                                           players_max, capacity, ping_avg * samples, ping_max))
+            rollup.reset()
+        rollup.t = bucket
+        rollup.add(*sample)
+
+
+class TimeSeries:
+    """Player count, capacity and ping per server and poll, in bounded typed-array rings. Older data is
+    only kept as minute and hour rollups; `query` picks the finest resolution that covers the range."""
+    servers: Dict[str, ServerSeries]
+
+    def __init__(self, raw: int = 2880, minutes: int = 10080, hours: int = 8760) -> None:
+        self.sizes = (raw, minutes, hours)
+        self.servers = dict()
+
+    def series(self, sid: str) -> ServerSeries:
+        series = self.servers.get(sid)
+        if series is None: series = self.servers[sid] = ServerSeries(*self.sizes)
+        return series
+
+    def record(self, sid: str, timestamp: datetime, players: int, capacity: int, pings: List[int]) -> None:
+        pings = [p for p in pings if isinstance(p, int)]
+        ping_min, ping_avg, ping_max = (min(pings), sum(pings) / len(pings), max(pings)) if pings else (0, 0, 0)
+        self.series(sid).record(timestamp.timestamp(), players, capacity, ping_min, ping_avg, ping_max)
+
+    def record_response(self, sid: str, timestamp: datetime, _json: Any) -> None:
+        """Records straight from the raw response, without decoding it."""
+        self.record(sid, timestamp, *sample_of(_json))
+
+    def repeat(self, sid: str, timestamp: datetime) -> None:
+        """Records the previous sample again, for polls that returned an identical response."""
+        series = self.series(sid)
+        last = series.raw.last()
+        if last is not None: series.record(timestamp.timestamp(), *last[1:])
+
+    def query(self, sid: str, start: datetime, end: datetime = None,
+              resolution: str = None) -> Tuple[str, List[Dict[str, float]]]:
+        """Rows between `start` and `end` as (resolution, rows), resolution being "raw", "minute" or "hour"."""
+        series = self.series(sid)
+        t0 = start.timestamp()
+        t1 = (end or datetime.now()).timestamp()
+        if resolution is None:
+            # The finest ring reaching back to start, or else the one reaching back furthest
+            rings = [(name, ring.first()) for name, ring in
+                     (("raw", series.raw), ("minute", series.minutes), ("hour", series.hours)) if ring.count]
+            covering = [name for name, first in rings if first <= t0]
+            resolution = covering[0] if covering else min(rings, key=lambda x: x[1])[0] if rings else "raw"
+        ring = {"raw": series.raw, "minute": series.minutes, "hour": series.hours}[resolution]
+        return resolution, [dict(zip(ring.names, row)) for row in ring.between(t0, t1)]
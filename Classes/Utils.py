@@ -0,0 +1,29 @@
+import re
+from datetime import datetime
+from pprint import pformat
+from typing import Optional
+
+
+def log(message, pretty=False, debug=False):
+    if debug: return
+    if message is str and pretty: message = pformat(message)
+    print(f"[{datetime.now()}] {message}")
+
+
+def sanitize(input: str) -> str:
+    # log(f"Sanitizing {input}", False, True)
+    return re.sub(r"\^\d", "", input.strip(), 0, re.MULTILINE)
+
+
+def getDiff(old, new) -> Optional[str]:
+    missing = (set(old).difference(new))
+    is_missing = len(missing) > 0
+    added = (set(new).difference(old))
+    is_added = len(added) > 0
+    if is_missing or is_added:
+        i = ["```diff"]
+        if is_missing: i.append("- " + '\n- '.join(sorted(missing, key=str.lower)))
+        if is_added:   i.append("+ " + '\n+ '.join(sorted(added, key=str.lower)))
+        i.append("```")
+        return '\n'.join(i)
+    return None
@@ -0,0 +1,153 @@
+# Sharded polling: worker processes each own a subset of the servers, run the Poller for them and send
+# the PollResults back over a queue. The bot process only publishes them to Discord and keeps the PlayerDB,
+# so decoding and diffing never compete with the gateway for the GIL.
+
+import asyncio
+import multiprocessing
+import queue
+import zlib
+from dataclasses import dataclass, field, replace
+from time import monotonic
+from typing import List, Optional
+
+from Classes.History import SnapshotHistory
+from Classes.Http import Http, create_session
+from Classes.Poller import API_URL, PollResult, Poller
+from Classes.Policy import IntervalPolicy
+from Classes.Replay import Recorder
+from Classes.Scheduler import PollScheduler
+from Classes.Server import Server
+from Classes.SnapshotCache import SnapshotCache
+from Classes.Utils import log
+from Classes.Writer import WriteBehind
+
+
+def shard_of(sid: str, shards: int) -> int:
+    """The worker a server belongs to. Stable across restarts, unlike hash()."""
+    return zlib.crc32(sid.encode('utf-8')) % shards
+
+
+@dataclass
+class WorkerSettings:
+    api_url: str = API_URL
+    lazy: bool = True
+    concurrency: int = 8
+    history_directory: str = "cache/history"
+    keyframe_every: int = 60
+    max_manual_snapshots: int = 32
+    session: dict = field(default_factory=dict)  # create_session() keyword arguments
+    retries: int = 2
+    backoff: float = 0.5
+    record_file: Optional[str] = None  # each worker records to `{record_file}.{shard}`
+    adaptive: bool = True
+    budget: Optional[float] = None  # polls per second for this worker, see IntervalPolicy
+
+
+def run_worker(shard: int, servers: List[Server], settings: WorkerSettings, results: multiprocessing.Queue,
+               control: multiprocessing.Queue) -> None:
+    asyncio.run(_run_worker(shard, servers, settings, results, control))
+
+
+async def _run_worker(shard: int, servers: List[Server], settings: WorkerSettings, results: multiprocessing.Queue,
+                      control: multiprocessing.Queue) -> None:
+    by_id = {server.id: server for server in servers}
+
+    async def publish(server: Server, result: PollResult) -> None:
+        results.put(result)  # doesn't block, the queue's feeder thread does the pickling and sending
+
+    writer = WriteBehind()
+    poller = Poller(publish, SnapshotCache(settings.max_manual_snapshots),
+                    SnapshotHistory(settings.history_directory, settings.keyframe_every, writer), writer,
+                    lambda sid: sid in by_id, settings.lazy, settings.api_url)
+    session = create_session(**settings.session)
+    poller.http = Http(session, settings.retries, settings.backoff)
+    if settings.adaptive: poller.policy = IntervalPolicy(settings.budget)
+    if settings.record_file: poller.recorder = Recorder(f"{settings.record_file}.{shard}", writer)
+    scheduler = PollScheduler(poller.check, settings.concurrency, poller.on_timeout)
+    scheduler.add(servers)
+    task = asyncio.create_task(scheduler.run())
+    log(f"[WORKER {shard}] Polling {len(servers)} servers")
+    try:
+        while True:
+            try:
+                command = await asyncio.to_thread(control.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if command[0] == "stop": break
+            if command[0] == "add":
+                by_id[command[1]] = command[2]
+                scheduler.schedule(command[2], monotonic())
+                continue
+            server = by_id.get(command[1])
+            if server is None: continue
+            if command[0] == "remove":
+                scheduler.remove(by_id.pop(server.id))
+                poller.snapshots.forget(server.id)
+                if poller.policy is not None: poller.policy.forget(server.id)
+            elif command[0] == "update":
+                for name, value in command[2].items(): setattr(server, name, value)
+                if {"interval", "pinned", "pinned_interval"} & command[2].keys(): scheduler.reschedule(server)
+            elif command[0] == "toggle":
+                server.disabled = command[2]
+                if server.disabled and poller.policy is not None: poller.policy.forget(server.id)
+            elif command[0] == "poll":
+                asyncio.create_task(poller.check(server))
+    finally:
+        task.cancel()
+        await session.close()
+        await asyncio.to_thread(writer.close)
+        log(f"[WORKER {shard}] Stopped")
+
+
+class WorkerPool:
+    """`count` worker processes polling the servers between them, see run_worker. Commands for a server
+    are routed to the worker that owns it: ("toggle", sid, disabled), ("poll", sid), ("add", sid, server),
+    ("update", sid, {field: value}) and ("remove", sid)."""
+    processes: List[multiprocessing.Process]
+    controls: List[multiprocessing.Queue]
+
+    def __init__(self, count: int, settings: WorkerSettings) -> None:
+        # spawn rather than fork, a forked child would inherit the bot's event loop and sockets
+        self.context = multiprocessing.get_context("spawn")
+        self.count = count
+        self.settings = settings
+        self.results = self.context.Queue()
+        self.processes = list()
+        self.controls = list()
+
+    def start(self, servers: List[Server]) -> None:
+        shards: List[List[Server]] = [list() for _ in range(self.count)]
+        for server in servers:
+            # Channels stay in the bot, results refer to their server by id
+            shards[shard_of(server.id, self.count)].append(replace(server, channel=None))
+        for i, shard in enumerate(shards):
+            control = self.context.Queue()
+            process = self.context.Process(target=run_worker, args=(i, shard, self.settings, self.results, control),
+                                           name=f"poller-{i}", daemon=True)
+            process.start()
+            self.controls.append(control)
+            self.processes.append(process)
+        log(f"Started {self.count} poller workers for {len(servers)} servers")
+
+    def add(self, server: Server) -> None:
+        self.send(server.id, "add", replace(server, channel=None))
+
+    def send(self, sid: str, *command) -> None:
+        self.controls[shard_of(sid, self.count)].put((command[0], sid) + command[1:])
+
+    async def receive(self) -> PollResult:
+        while True:
+            try:
+                # With a timeout, so the executor thread never outlives the event loop
+                return await asyncio.to_thread(self.results.get, True, 1.0)
+            except queue.Empty:
+                continue
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self.processes)
+
+    def stop(self, timeout: Optional[float] = 5) -> None:
+        for control in self.controls: control.put(("stop",))
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive(): process.terminate()
@@ -0,0 +1,151 @@
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Dict, Optional, Union
+
+from Classes.Utils import log
+
+Content = Union[str, Callable[[], str]]
+
+
+class PendingWrite:
+    """Replace the file with `content` (then append `tail`), or with `append` only add `tail` to it."""
+
+    def __init__(self, content: Optional[Content], tail: str = "", append: bool = False) -> None:
+        self.content = content
+        self.tail = tail
+        self.append = append
+        self.queued = monotonic()
+
+
+class WriteBehind:
+    """Hands file writes to one worker thread so they never block the event loop.
+
+    A write that is still pending when the same file is written again is replaced by the newer one, appends
+    to the same file are merged. Every file is written to a temp file and renamed over the old one, so a
+    crash leaves either the old or the new version. Ops run in the order they were last queued, which is
+    what PlayerDB relies on to make the snapshot durable before the journal is truncated."""
+    pending: "OrderedDict[str, PendingWrite]"
+
+    def __init__(self) -> None:
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.busy = False
+        self.closed = False
+        self.writes = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_latency = 0.0  # seconds from queueing to the write hitting the disk
+        self.max_latency = 0.0
+        self.thread = threading.Thread(target=self._run, name="WriteBehind", daemon=True)
+        self.thread.start()
+
+    def write(self, filename: str, content: Content) -> None:
+        """Replace `filename` with `content`, a string or a function producing it that is called on the
+        worker thread."""
+        with self.condition:
+            if self.pending.pop(filename, None) is not None: self.coalesced += 1
+            self.pending[filename] = PendingWrite(content)
+            self.condition.notify()
+
+    def append(self, filename: str, text: str) -> None:
+        with self.condition:
+            op = self.pending.pop(filename, None)
+            if op is None:
+                op = PendingWrite(None, append=True)
+            else:
+                self.coalesced += 1
+            op.tail += text
+            self.pending[filename] = op
+            self.condition.notify()
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending)
+
+    def stats(self) -> Dict[str, float]:
+        return {"depth": self.depth, "writes": self.writes, "coalesced": self.coalesced, "errors": self.errors,
+                "last_latency": self.last_latency, "max_latency": self.max_latency}
+
+    def flush(self) -> None:
+        """Blocks until everything queued so far is on disk."""
+        with self.condition:
+            while self.pending or self.busy:
+                self.condition.wait()
+
+    def close(self) -> None:
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending: return
+                filename, op = self.pending.popitem(last=False)
+                self.busy = True
+            try:
+                self._write(filename, op)
+                self.writes += 1
+            except Exception as ex:
+                self.errors += 1
+                log(f"[WRITER] Failed to write \"{filename}\": {ex!r}")
+            self.last_latency = monotonic() - op.queued
+            self.max_latency = max(self.max_latency, self.last_latency)
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+
+    @staticmethod
+    def _write(filename: str, op: PendingWrite) -> None:
+        if op.append:
+            append_file(filename, op.tail)
+        else:
+            write_file(filename, op.content, op.tail)
+
+
+def write_file(filename: str, content: Content, tail: str = "") -> None:
+    """Writes through a temp file that is renamed over `filename`, so readers never see a partial file."""
+    content = content() if callable(content) else content
+    tmp = filename + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.write(tail)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def append_file(filename: str, text: str) -> None:
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def truncate_torn_tail(filename: str, chunk: int = 65536) -> int:
+    """Cuts off the last line of an append-only file if a crash left it without its newline, so the next
+    append starts on a line of its own instead of being glued to the torn one. Returns the bytes removed."""
+    with open(filename, 'r+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            position = start
+        else:
+            keep = 0
+        if keep < end:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+        return end - keep
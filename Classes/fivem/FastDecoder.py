@@ -0,0 +1,163 @@
+# Exception-free decoder for ServerResponseSingle.
+#
+# The quicktype decoders run every field through from_union, which tries each
+# alternative and catches the AssertionError of the ones that don't fit. Here
+# the same schema is compiled once, at import time, into one straight-line
+# function per class that only does `x.__class__ is ...` checks. Anything the
+# fast checks don't recognise is handed to the original from_union for that
+# field, so the result (or the error) is always the same as from_dict.
+#
+#     result = fast_server_response_single_from_dict(json.loads(json_string))
+
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import UUID
+
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle, Data, Player, Vars, from_union, from_str, \
+    from_none, from_int, from_bool, from_list, from_stringified_bool, from_datetime
+
+STR = "str"
+INT = "int"
+BOOL = "bool"
+STR_LIST = "str_list"
+STRINGIFIED_BOOL = "stringified_bool"
+STRINGIFIED_INT = "stringified_int"
+OTHER = "other"  # no fast path, always decoded by the original union (UUID, datetime)
+CLASS = "class"
+CLASS_LIST = "class_list"
+
+STR_TYPES = {str}
+
+# (json key, kind, class for CLASS/CLASS_LIST or union for OTHER), in constructor order
+SCHEMA: Dict[type, List[Tuple[str, str, Any]]] = {
+    Player: [
+        ("endpoint", STR, None),
+        ("id", INT, None),
+        ("identifiers", STR_LIST, None),
+        ("name", STR, None),
+        ("ping", INT, None),
+    ],
+    Vars: [
+        ("onesync_enabled", STRINGIFIED_BOOL, None),
+        ("sv_enforceGameBuild", STRINGIFIED_INT, None),
+        ("sv_enhancedHostSupport", STRINGIFIED_BOOL, None),
+        ("sv_lan", STRINGIFIED_BOOL, None),
+        ("sv_maxClients", STRINGIFIED_INT, None),
+        ("sv_scriptHookAllowed", STRINGIFIED_BOOL, None),
+        ("EssentialModeUUID", OTHER, [lambda x: UUID(x), from_none]),
+        ("EssentialModeVersion", STR, None),
+        ("Routen", STR, None),
+        ("banner_connecting", STR, None),
+        ("banner_detail", STR, None),
+        ("gamename", STR, None),
+        ("locale", STR, None),
+        ("sv_licenseKeyToken", STR, None),
+        ("sv_projectDesc", STR, None),
+        ("sv_projectName", STR, None),
+        ("tags", STR, None),
+        ("txAdmin-version", STR, None),
+        ("\U0001f4dd Discord", STR, None),
+        ("\U0001f50a Teamspeak", STR, None),
+        ("\U0001f525 Roleplay ", STR, None),
+        ("premium", STR, None),
+    ],
+    Data: [
+        ("clients", INT, None),
+        ("gametype", STR, None),
+        ("hostname", STR, None),
+        ("mapname", STR, None),
+        ("sv_maxclients", INT, None),
+        ("enhancedHostSupport", BOOL, None),
+        ("resources", STR_LIST, None),
+        ("server", STR, None),
+        ("vars", CLASS, Vars),
+        ("selfReportedClients", INT, None),
+        ("players", CLASS_LIST, Player),
+        ("ownerID", INT, None),
+        ("connectEndPoints", STR_LIST, None),
+        ("upvotePower", INT, None),
+        ("support_status", STR, None),
+        ("svMaxclients", INT, None),
+        ("ownerName", STR, None),
+        ("ownerProfile", STR, None),
+        ("ownerAvatar", STR, None),
+        ("lastSeen", OTHER, [from_datetime, from_none]),
+        ("iconVersion", INT, None),
+    ],
+    ServerResponseSingle: [
+        ("EndPoint", STR, None),
+        ("Data", CLASS, Data),
+    ],
+}
+
+
+def slow_union(kind: str, arg: Any) -> list:
+    """The from_union alternatives the generated from_dict uses for a field of this kind."""
+    if kind == STR: return [from_str, from_none]
+    if kind == INT: return [from_int, from_none]
+    if kind == BOOL: return [from_bool, from_none]
+    if kind == STR_LIST: return [lambda x: from_list(from_str, x), from_none]
+    if kind == STRINGIFIED_BOOL: return [from_none, lambda x: from_stringified_bool(from_str(x))]
+    if kind == STRINGIFIED_INT: return [from_none, lambda x: int(from_str(x))]
+    if kind == CLASS: return [arg.from_dict, from_none]
+    if kind == CLASS_LIST: return [lambda x: from_list(arg.from_dict, x), from_none]
+    return arg
+
+
+def field_source(kind: str, arg: Any, slow: str) -> List[str]:
+    if kind == STR: return [f"if x is not None and x.__class__ is not str: x = {slow}(x)"]
+    if kind == INT: return [f"if x is not None and x.__class__ is not int: x = {slow}(x)"]
+    if kind == BOOL: return [f"if x is not None and x.__class__ is not bool: x = {slow}(x)"]
+    if kind == STR_LIST: return ["if x is None: pass",
+                                 "elif x.__class__ is list and set(map(type, x)) <= STR_TYPES: x = x[:]",
+                                 f"else: x = {slow}(x)"]
+    if kind == STRINGIFIED_BOOL: return ["if x is None: pass",
+                                         "elif x == 'true': x = True",
+                                         "elif x == 'false': x = False",
+                                         f"else: x = {slow}(x)"]
+    if kind == STRINGIFIED_INT: return ["if x is None: pass",
+                                        "elif x.__class__ is str and x.isascii() and x.isdigit(): x = int(x)",
+                                        f"else: x = {slow}(x)"]
+    if kind == CLASS: return ["if x is None: pass",
+                              f"elif x.__class__ is dict: x = decode_{arg.__name__}(x)",
+                              f"else: x = {slow}(x)"]
+    if kind == CLASS_LIST: return ["if x is None: pass",
+                                   f"elif x.__class__ is list: x = [decode_{arg.__name__}(y) for y in x]",
+                                   f"else: x = {slow}(x)"]
+    return [f"if x is not None: x = {slow}(x)"]
+
+
+def compile_decoders() -> Dict[type, Callable[[Any], Any]]:
+    namespace: Dict[str, Any] = {"STR_TYPES": STR_TYPES}
+    lines: List[str] = []
+    for cls, schema in SCHEMA.items():
+        assert len(schema) == len(fields(cls)), f"{cls.__name__} schema is out of date"
+        name = cls.__name__
+        namespace[name] = cls
+        args = []
+        lines.append(f"def decode_{name}(obj):")
+        lines.append(f"    if obj.__class__ is not dict: return {name}.from_dict(obj)")
+        lines.append("    get = obj.get")
+        for i, (key, kind, arg) in enumerate(schema):
+            slow = f"slow_{name}_{i}"
+            alternatives = slow_union(kind, arg)
+            namespace[slow] = lambda x, alternatives=alternatives: from_union(alternatives, x)
+            lines.append(f"    x = get({key!r})")
+            lines.extend("    " + line for line in field_source(kind, arg, slow))
+            lines.append(f"    f{i} = x")
+            args.append(f"f{i}")
+        lines.append(f"    return {name}({', '.join(args)})")
+        lines.append("")
+    exec(compile("\n".join(lines), __name__, "exec"), namespace)
+    return {cls: namespace[f"decode_{cls.__name__}"] for cls in SCHEMA}
+
+
+decoders = compile_decoders()
+decode_player = decoders[Player]
+decode_vars = decoders[Vars]
+decode_data = decoders[Data]
+decode_server_response_single = decoders[ServerResponseSingle]
+
+
+def fast_server_response_single_from_dict(s: Any) -> ServerResponseSingle:
+    return decode_server_response_single(s)
@@ -0,0 +1,84 @@
+# Lazy, field-on-demand view of a ServerResponseSingle.
+#
+# lazy_server_response_single_from_dict only wraps the raw dict. Every field is
+# decoded the first time it is read, with the same compiled per-field code as
+# FastDecoder, and memoized on the view. Nested objects (Data, Vars) are views
+# themselves, so reading data.hostname never touches lastSeen, owner info or
+# vars. Lists of players are decoded as a whole on first access.
+#
+#     result = lazy_server_response_single_from_dict(json.loads(json_string))
+#     result.data.players  # only now are Data.players decoded
+
+from dataclasses import fields
+from typing import Any, Callable, Dict, List, Tuple
+
+from Classes.fivem.FastDecoder import SCHEMA, STR_TYPES, slow_union, field_source, decoders
+from Classes.fivem.ServerResponseSingle import ServerResponseSingle, Data, Player, Vars, from_union
+
+
+class LazyView:
+    """Base for the generated views. `_fields` maps attribute name to (json key, field decoder)."""
+    _cls: type
+    _fields: Dict[str, Tuple[str, Callable[[Any], Any]]]
+
+    def __init__(self, raw: dict) -> None:
+        self._raw = raw
+
+    def __getattr__(self, name: str) -> Any:
+        field = self._fields.get(name)
+        if field is None: raise AttributeError(name)
+        key, decode = field
+        value = decode(self._raw.get(key))
+        self.__dict__[name] = value
+        return value
+
+    def materialize(self) -> Any:
+        """The fully decoded dataclass, same as from_dict."""
+        return decoders[self._cls](self._raw)
+
+    def to_dict(self) -> dict:
+        return self.materialize().to_dict()
+
+    def __repr__(self) -> str:
+        decoded = ", ".join(f"{k}={v!r}" for k, v in self.__dict__.items() if not k.startswith("_"))
+        return f"Lazy{self._cls.__name__}({decoded})"
+
+
+def compile_views() -> Dict[type, type]:
+    namespace: Dict[str, Any] = {"STR_TYPES": STR_TYPES, "decode_Player": decoders[Player]}
+    lines: List[str] = []
+    names: Dict[type, List[Tuple[str, str, str]]] = dict()
+    for cls, schema in SCHEMA.items():
+        if cls is Player: continue
+        names[cls] = list()
+        for i, (key, kind, arg) in enumerate(schema):
+            slow = f"slow_{cls.__name__}_{i}"
+            alternatives = slow_union(kind, arg)
+            namespace[slow] = lambda x, alternatives=alternatives: from_union(alternatives, x)
+            function = f"field_{cls.__name__}_{i}"
+            lines.append(f"def {function}(x):")
+            lines.extend("    " + line for line in field_source(kind, arg, slow))
+            lines.append("    return x")
+            lines.append("")
+            names[cls].append((fields(cls)[i].name, key, function))
+    exec(compile("\n".join(lines), __name__, "exec"), namespace)
+    result = dict()
+    for cls, _fields in names.items():
+        result[cls] = type(f"Lazy{cls.__name__}", (LazyView,), {
+            "_cls": cls,
+            "_fields": {name: (key, namespace[function]) for name, key, function in _fields},
+        })
+        # The generated field code only calls decode_X on dicts, anything else goes through from_union
+        namespace[f"decode_{cls.__name__}"] = result[cls]
+    return result
+
+
+views = compile_views()
+LazyServerResponseSingle = views[ServerResponseSingle]
+LazyData = views[Data]
+LazyVars = views[Vars]
+
+
+def lazy_server_response_single_from_dict(s: Any) -> ServerResponseSingle:
+    if s.__class__ is not dict: return ServerResponseSingle.from_dict(s)
+    return LazyServerResponseSingle(s)
@@ -0,0 +1,179 @@
+# Reader for the servers-frontend bulk server list (api/servers/streamRedir/).
+#
+# The stream is a sequence of frames, each a little-endian uint32 length
+# followed by a protobuf `master.Server` message:
+#
+#     message Server { string EndPoint = 1; ServerData Data = 2; }
+#     message ServerData {
+#         int32 svMaxclients = 1; int32 clients = 2; int32 protocol = 3;
+#         string hostname = 4; string gametype = 5; string mapname = 6;
+#         repeated string resources = 8; string server = 9;
+#         repeated Player players = 10; int32 iconVersion = 11;
+#         map<string, string> vars = 12; bool enhancedHostSupport = 16;
+#         int32 upvotePower = 17; repeated string connectEndPoints = 18;
+#         int32 burstPower = 19;
+#     }
+#     message Player {
+#         string name = 1; repeated string identifiers = 2;
+#         string endpoint = 3; int32 ping = 4; int32 id = 5;
+#     }
+#
+# Entries are converted to the same dict shape as api/servers/single/, so they
+# go through the regular decoders. There is no protobuf dependency, the few
+# wire types used here are decoded by hand.
+
+import struct
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+VARINT = 0
+FIXED64 = 1
+LENGTH = 2
+FIXED32 = 5
+
+
+def read_varint(buf: bytes, i: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80: return result, i
+        shift += 7
+
+
+def fields(buf: bytes) -> Iterator[Tuple[int, int, Any]]:
+    """(field number, wire type, value) for every field of a message; LENGTH values are bytes."""
+    i, end = 0, len(buf)
+    while i < end:
+        key, i = read_varint(buf, i)
+        number, wire = key >> 3, key & 7
+        if wire == VARINT:
+            value, i = read_varint(buf, i)
+        elif wire == LENGTH:
+            length, i = read_varint(buf, i)
+            value = buf[i:i + length]
+            i += length
+        elif wire == FIXED32:
+            value = buf[i:i + 4]
+            i += 4
+        elif wire == FIXED64:
+            value = buf[i:i + 8]
+            i += 8
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield number, wire, value
+
+
+def int32(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def decode_player(buf: bytes) -> dict:
+    player: Dict[str, Any] = {"identifiers": []}
+    for number, wire, value in fields(buf):
+        if number == 1: player["name"] = value.decode('utf-8', 'replace')
+        elif number == 2: player["identifiers"].append(value.decode('utf-8', 'replace'))
+        elif number == 3: player["endpoint"] = value.decode('utf-8', 'replace')
+        elif number == 4: player["ping"] = int32(value)
+        elif number == 5: player["id"] = int32(value)
+    return player
+
+
+def decode_data(buf: bytes) -> dict:
+    data: Dict[str, Any] = {"resources": [], "players": [], "vars": {}, "connectEndPoints": []}
+    for number, wire, value in fields(buf):
+        if number == 1:
+            data["sv_maxclients"] = data["svMaxclients"] = int32(value)
+        elif number == 2:
+            data["clients"] = data["selfReportedClients"] = int32(value)
+        elif number == 4: data["hostname"] = value.decode('utf-8', 'replace')
+        elif number == 5: data["gametype"] = value.decode('utf-8', 'replace')
+        elif number == 6: data["mapname"] = value.decode('utf-8', 'replace')
+        elif number == 8: data["resources"].append(value.decode('utf-8', 'replace'))
+        elif number == 9: data["server"] = value.decode('utf-8', 'replace')
+        elif number == 10: data["players"].append(decode_player(value))
+        elif number == 11: data["iconVersion"] = int32(value)
+        elif number == 12:
+            entry = {n: v.decode('utf-8', 'replace') for n, w, v in fields(value)}
+            data["vars"][entry.get(1, "")] = entry.get(2, "")
+        elif number == 16: data["enhancedHostSupport"] = bool(value)
+        elif number == 17: data["upvotePower"] = int32(value)
+        elif number == 18: data["connectEndPoints"].append(value.decode('utf-8', 'replace'))
+    return data
+
+
+def decode_server(frame: bytes) -> dict:
+    """A stream entry in the shape of a servers/single/ response."""
+    server: Dict[str, Any] = {}
+    for number, wire, value in fields(frame):
+        if number == 1: server["EndPoint"] = value.decode('utf-8', 'replace')
+        elif number == 2: server["Data"] = decode_data(value)
+    return server
+
+
+def endpoint_of(frame: bytes) -> Optional[str]:
+    """Only the EndPoint of a stream entry, without decoding the rest."""
+    for number, wire, value in fields(frame):
+        if number == 1 and wire == LENGTH: return value.decode('utf-8', 'replace')
+    return None
+
+
+async def iter_frames(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Splits a stream of byte chunks into frames as soon as each one is complete."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        i = 0
+        while len(buffer) - i >= 4:
+            length = struct.unpack_from("<I", buffer, i)[0]
+            if len(buffer) - i - 4 < length: break
+            yield bytes(buffer[i + 4:i + 4 + length])
+            i += 4 + length
+        del buffer[:i]
+
+
+# Encoding, used by the stand-in frontend (tools/frontend_standin.py) to serve recorded responses
+
+def write_varint(value: int) -> bytes:
+    if value < 0: value += 1 << 64
+    out = bytearray()
+    while True:
+        b = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def field(number: int, value: Any) -> bytes:
+    if isinstance(value, bool) or isinstance(value, int):
+        return write_varint(number << 3 | VARINT) + write_varint(int(value))
+    if isinstance(value, str): value = value.encode('utf-8')
+    return write_varint(number << 3 | LENGTH) + write_varint(len(value)) + value
+
+
+def encode_player(player: dict) -> bytes:
+    out: List[bytes] = []
+    if player.get("name") is not None: out.append(field(1, player["name"]))
+    out.extend(field(2, x) for x in player.get("identifiers") or [])
+    if player.get("endpoint") is not None: out.append(field(3, player["endpoint"]))
+    if player.get("ping") is not None: out.append(field(4, player["ping"]))
+    if player.get("id") is not None: out.append(field(5, player["id"]))
+    return b"".join(out)
+
+
+def encode_server(_json: dict) -> bytes:
+    data = _json.get("Data") or {}
+    out: List[bytes] = []
+    for number, key in ((1, "sv_maxclients"), (2, "clients"), (4, "hostname"), (5, "gametype"), (6, "mapname"),
+                        (9, "server"), (11, "iconVersion"), (16, "enhancedHostSupport"), (17, "upvotePower")):
+        if data.get(key) is not None: out.append(field(number, data[key]))
+    out.extend(field(8, x) for x in data.get("resources") or [])
+    out.extend(field(10, encode_player(x)) for x in data.get("players") or [])
+    out.extend(field(12, field(1, k) + field(2, str(v))) for k, v in (data.get("vars") or {}).items())
+    out.extend(field(18, x) for x in data.get("connectEndPoints") or [])
+    message = field(1, _json.get("EndPoint") or "") + field(2, b"".join(out))
+    return struct.pack("<I", len(message)) + message
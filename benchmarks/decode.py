@@ -0,0 +1,26 @@
+# Compares the quicktype from_dict decoder with the compiled FastDecoder.
+#
+#     python -m benchmarks.decode [players] [resources]
+
+import sys
+from dataclasses import astuple
+from timeit import timeit
+
+from Classes.fivem.FastDecoder import fast_server_response_single_from_dict
+from Classes.fivem.ServerResponseSingle import server_response_single_from_dict
+from benchmarks.synthetic import synthetic_response
+
+
+def main(players: int = 2000, resources: int = 1000, number: int = 20):
+    response = synthetic_response(players, resources=resources)
+    assert astuple(fast_server_response_single_from_dict(response)) == \
+        astuple(server_response_single_from_dict(response))
+    slow = timeit(lambda: server_response_single_from_dict(response), number=number) / number
+    fast = timeit(lambda: fast_server_response_single_from_dict(response), number=number) / number
+    print(f"{players} players, {resources} resources")
+    print(f"from_dict: {slow * 1000:8.2f} ms")
+    print(f"fast:      {fast * 1000:8.2f} ms ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*[int(x) for x in sys.argv[1:3]])
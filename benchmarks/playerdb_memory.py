@@ -0,0 +1,128 @@
+# Memory a loaded PlayerDB takes per player, records and lookup indexes included, next to the same players
+# in the layout PlayerDB used before its records were slotted (see LegacyDB below).
+#
+#     python -m benchmarks.playerdb_memory [players ...]
+
+import gc
+import json
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from Classes.Player import StampCache, PlayerDB, fast_player_from_dict, from_datetime
+from benchmarks.synthetic import synthetic_db_player
+
+
+# The old layout: plain dataclasses with a __dict__ each, datetimes, the identifier split into name and
+# value, a Server per sighting, nothing interned and every index key mapping to a list. Only what takes
+# memory is kept, the (type, value) index included.
+
+@dataclass
+class OldIdentifier:
+    identifier: str
+    name: str
+    value: str
+    last_seen: Optional[datetime]
+
+
+@dataclass
+class OldValue:  # Name, Endpoint and Character had the same shape
+    value: Optional[str]
+    other: Any  # last_seen, or a Character's phone
+
+
+@dataclass
+class OldServer:
+    id: Optional[str]
+    name: Optional[str]
+
+
+@dataclass
+class OldSeenOn:
+    server: OldServer
+    last_seen: Optional[datetime]
+    characters: List[OldValue]
+    identifiers: List[OldIdentifier]
+    endpoints: List[OldValue]
+    names: List[OldValue]
+
+
+@dataclass
+class OldPlayer:
+    seen_on: List[OldSeenOn]
+
+
+class LegacyDB:
+    def __init__(self) -> None:
+        self.players: List[OldPlayer] = list()
+        self.by_identifier: Dict[str, List[OldPlayer]] = dict()
+        self.by_type_value: Dict[tuple, List[OldPlayer]] = dict()
+        self.by_name: Dict[str, List[OldPlayer]] = dict()
+        self.by_endpoint: Dict[str, List[OldPlayer]] = dict()
+        self.dates: Dict[str, datetime] = dict()  # the old DateCache
+
+    def date(self, x: Any) -> Optional[datetime]:
+        if x is None: return None
+        parsed = self.dates.get(x)
+        if parsed is None: parsed = self.dates[x] = from_datetime(x)
+        return parsed
+
+    def add(self, obj: dict) -> None:
+        player = OldPlayer(list())
+        for s in obj["seen_on"]:
+            identifiers = list()
+            for i in s["identifiers"]:
+                split = i["identifier"].split(":")
+                name, value = (split[0], split[1]) if len(split) > 1 else ("", "")
+                identifiers.append(OldIdentifier(i["identifier"], name, value, self.date(i["last_seen"])))
+            seen_on = OldSeenOn(OldServer(s["server"]["id"], s["server"]["name"]), self.date(s["last_seen"]),
+                                [OldValue(c["name"], c["phone"]) for c in s["characters"]], identifiers,
+                                [OldValue(e["endpoint"], self.date(e["last_seen"])) for e in s["endpoints"]],
+                                [OldValue(n["name"], self.date(n["last_seen"])) for n in s["names"]])
+            player.seen_on.append(seen_on)
+            for i in identifiers:
+                self.index(self.by_identifier, i.identifier, player)
+                self.index(self.by_type_value, (i.name, i.value), player)
+            for n in seen_on.names: self.index(self.by_name, n.value, player)
+            for e in seen_on.endpoints: self.index(self.by_endpoint, e.value, player)
+        self.players.append(player)
+
+    @staticmethod
+    def index(index: dict, key, player: OldPlayer) -> None:
+        players = index.setdefault(key, list())
+        if not any(p is player for p in players): players.append(player)
+
+
+def measure(players: int, layout: str) -> None:
+    gc.collect()
+    tracemalloc.start()
+    started = perf_counter()
+    if layout == "before":
+        db = LegacyDB()
+        for i in range(players):
+            # Through JSON so that repeated strings are separate objects, as they are after json.load
+            db.add(json.loads(json.dumps(synthetic_db_player(i))))
+        db.dates.clear()
+    else:
+        db = PlayerDB("cache/benchmark.missing.json")
+        stamp = StampCache()
+        for i in range(players):
+            player = fast_player_from_dict(json.loads(json.dumps(synthetic_db_player(i))), stamp)
+            db.players.append(player)
+            db.index(player)
+        del stamp
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{layout:>6} {players:>9} players: {size / 2 ** 20:9.1f} MiB, {size / players:7.0f} bytes per player "
+          f"({perf_counter() - started:.1f}s)")
+    del db
+
+
+if __name__ == "__main__":
+    for n in [int(x) for x in sys.argv[1:]] or [100000, 1000000]:
+        measure(n, "before")
+        measure(n, "after")
@@ -0,0 +1,133 @@
+# Times the per-poll hot paths on synthetic responses and writes the results as JSON, so two versions can be
+# compared. Time is per call; memory is measured over one more call under tracemalloc: "peak" is the most
+# memory in use during the call, "allocated" what it still held at the end and "blocks" in how many objects.
+#
+#     python -m benchmarks.suite [--players N] [--identifiers N] [--resources N] [--churn RATE]
+#                                [--db-players N] [--output FILE] [--compare OLD_FILE]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from os import path
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from Classes.Player import PlayerDB
+from Classes.PlayerDiff import getPlayerDiff
+from Classes.Utils import getDiff, sanitize
+from Classes.fivem.ServerResponseSingle import server_response_single_from_dict
+from benchmarks.synthetic import churned, synthetic_db_player, synthetic_response
+
+
+def measure(name: str, fn: Callable[[], object], repeat: int = 5, number: int = 0) -> Dict:
+    quiet = io.StringIO()  # PlayerDB logs every save and load
+    with contextlib.redirect_stdout(quiet):
+        if not number:
+            # Enough calls for a repeat to take about 0.2s
+            started = perf_counter()
+            fn()
+            number = max(1, int(0.2 / max(perf_counter() - started, 1e-9)))
+        times = list()
+        for _ in range(repeat):
+            started = perf_counter()
+            for _ in range(number): fn()
+            times.append((perf_counter() - started) / number)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()  # the snapshot itself is traced too
+        tracemalloc.reset_peak()
+        result = fn()
+        allocated, peak = (m - baseline for m in tracemalloc.get_traced_memory())
+        blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+        tracemalloc.stop()
+        del result
+    return {"name": name, "calls": number * repeat, "min": min(times), "median": statistics.median(times),
+            "mean": statistics.fmean(times), "peak": peak, "allocated": allocated, "blocks": blocks}
+
+
+def version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(players: int, identifiers: int, resources: int, churn: float, db_players: int) -> List[Dict]:
+    old = synthetic_response(players, identifiers, resources)
+    new = churned(old, churn, seed=1)
+    old_server = server_response_single_from_dict(old)
+    new_server = server_response_single_from_dict(new)
+    names = [p["name"] for p in new["Data"]["players"]]
+    results = [
+        measure("server_response_single_from_dict", lambda: server_response_single_from_dict(new)),
+        measure("getDiff", lambda: getDiff(old_server.data.resources, new_server.data.resources)),
+        measure("getPlayerDiff", lambda: getPlayerDiff(old_server.data.players, new_server.data.players)),
+        measure("sanitize", lambda: [sanitize(name) for name in names]),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        file = path.join(directory, "players.db.json")
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump([synthetic_db_player(i, identifiers) for i in range(db_players)], f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            db = PlayerDB(file)
+
+        def update():
+            # The same players every call: after the first one these are updates, as for a busy server
+            for player in new_server.data.players: db.updatePlayer(new_server, player)
+
+        results.append(measure("PlayerDB.updatePlayer", update))
+        results.append(measure("PlayerDB.save", db.save, repeat=3, number=1))
+        results.append(measure("PlayerDB.load", lambda: PlayerDB(file), repeat=3, number=1))
+    per_item = {"sanitize": len(names), "PlayerDB.updatePlayer": len(new_server.data.players)}
+    for result in results:
+        if result["name"] in per_item: result["items"] = per_item[result["name"]]
+    return results
+
+
+def compare(results: List[Dict], old_file: str) -> None:
+    with open(old_file, "r", encoding="utf-8") as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"\ncompared to {old_file}:")
+    for r in results:
+        if r["name"] not in old: continue
+        o = old[r["name"]]
+        print(f"{r['name']:<34} time {r['median'] / o['median']:6.2f}x  peak {r['peak'] / max(o['peak'], 1):6.2f}x")
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--identifiers", type=int, default=4)
+    parser.add_argument("--resources", type=int, default=300)
+    parser.add_argument("--churn", type=float, default=0.1, help="share of players and resources changed per poll")
+    parser.add_argument("--db-players", type=int, default=10000)
+    parser.add_argument("--output", default="cache/benchmark.json")
+    parser.add_argument("--compare")
+    args = parser.parse_args(argv)
+    params = {"players": args.players, "identifiers": args.identifiers, "resources": args.resources,
+              "churn": args.churn, "db_players": args.db_players}
+    results = run(**params)
+    for r in results:
+        print(f"{r['name']:<34} {r['median'] * 1000:10.3f} ms  peak {r['peak'] / 1024:10.1f} KiB  "
+              f"allocated {r['allocated'] / 1024:10.1f} KiB  {r['blocks']:8} blocks")
+    report = {"version": version(), "python": platform.python_version(), "platform": platform.platform(),
+              "timestamp": datetime.now().isoformat(timespec="seconds"), "params": params, "results": results}
+    os.makedirs(path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Wrote {args.output}")
+    if args.compare: compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
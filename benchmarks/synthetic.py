@@ -0,0 +1,110 @@
+import random
+from typing import List
+
+
+def synthetic_player(i: int, identifiers: int = 4) -> dict:
+    kinds = ["license", "steam", "discord", "xbl", "live", "fivem", "license2", "ip"]
+    return {
+        "endpoint": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{30000 + i % 1000}",
+        "id": i,
+        "identifiers": [f"{kinds[k % len(kinds)]}:{i:08x}{k:04x}" for k in range(identifiers)],
+        "name": f"^{i % 10}Player {i}",
+        "ping": random.randint(10, 300),
+    }
+
+
+def synthetic_resources(count: int) -> List[str]:
+    return [f"resource_{i}" for i in range(count)]
+
+
+def synthetic_response(players: int = 200, identifiers: int = 4, resources: int = 300,
+                       endpoint: str = "abc123") -> dict:
+    """A FiveM servers/single/ response shaped like the real thing."""
+    return {
+        "EndPoint": endpoint,
+        "Data": {
+            "clients": players,
+            "gametype": "Freeroam",
+            "hostname": "^1Synthetic ^7Roleplay | discord.gg/synthetic",
+            "mapname": "San Andreas",
+            "sv_maxclients": max(players, 64),
+            "enhancedHostSupport": True,
+            "resources": synthetic_resources(resources),
+            "server": "FXServer-master SERVER v1.0.0.4394 win32",
+            "vars": {
+                "onesync_enabled": "true",
+                "sv_enforceGameBuild": "2189",
+                "sv_enhancedHostSupport": "true",
+                "sv_lan": "false",
+                "sv_maxClients": str(max(players, 64)),
+                "sv_scriptHookAllowed": "false",
+                "EssentialModeUUID": "0a1b2c3d-4e5f-6071-8293-a4b5c6d7e8f9",
+                "EssentialModeVersion": "6.4.0",
+                "banner_connecting": "https://example.com/connecting.png",
+                "banner_detail": "https://example.com/detail.png",
+                "gamename": "gta5",
+                "locale": "en-US",
+                "sv_licenseKeyToken": "cfxk_synthetic",
+                "sv_projectDesc": "A synthetic server",
+                "sv_projectName": "Synthetic",
+                "tags": "roleplay, synthetic, esx",
+                "txAdmin-version": "3.7.0",
+                "premium": "pt",
+            },
+            "selfReportedClients": players,
+            "players": [synthetic_player(i, identifiers) for i in range(players)],
+            "ownerID": 1234567,
+            "connectEndPoints": ["127.0.0.1:30120"],
+            "upvotePower": 0,
+            "support_status": "supported",
+            "svMaxclients": max(players, 64),
+            "ownerName": "synthetic",
+            "ownerProfile": "https://forum.cfx.re/u/synthetic",
+            "ownerAvatar": "https://example.com/avatar.png",
+            "lastSeen": "2021-06-09T12:00:00.0000000Z",
+            "iconVersion": 123,
+        },
+    }
+
+
+SERVERS = [(f"srv{s:03d}", f"^{s % 10}Synthetic Roleplay #{s} | discord.gg/synthetic{s}") for s in range(20)]
+POLLS = [f"2021-06-{1 + p // 1440:02d}T{p // 60 % 24:02d}:{p % 60:02d}:00.{p * 7919 % 1000000:06d}"
+         for p in range(0, 14 * 1440, 3)]
+
+
+def synthetic_db_player(i: int, identifiers: int = 4, servers: int = 2) -> dict:
+    """A PlayerDB record as saved to players.db.json, seen on up to `servers` servers with a name change here
+    and there. Timestamps come from a fixed set of poll times, like in a real DB."""
+    rng = random.Random(i)
+    player = synthetic_player(i, identifiers)
+    seen_on = []
+    for server_id, hostname in rng.sample(SERVERS, rng.randint(1, servers)):
+        seen = rng.choice(POLLS)
+        names = [{"name": player["name"], "last_seen": seen}]
+        if rng.random() < 0.2: names.append({"name": f"{player['name']} (old)", "last_seen": rng.choice(POLLS)})
+        seen_on.append({
+            "server": {"id": server_id, "name": hostname},
+            "last_seen": seen,
+            "characters": [],
+            "identifiers": [{"identifier": x, "last_seen": seen} for x in player["identifiers"]],
+            "endpoints": [{"endpoint": player["endpoint"], "last_seen": seen}],
+            "names": names,
+        })
+    return {"seen_on": seen_on}
+
+
+def churned(response: dict, rate: float = 0.1, seed: int = 0) -> dict:
+    """The next poll of `response`: `rate` of the players left and as many new ones joined, every ping moved
+    and `rate` of the resources were swapped for new ones."""
+    rng = random.Random(seed)
+    data = dict(response["Data"])
+    players = [dict(p, ping=max(1, p["ping"] + rng.randint(-20, 20))) for p in data["players"]]
+    identifiers = len(players[0]["identifiers"]) if players else 4
+    next_id = max((p["id"] for p in players), default=-1) + 1
+    for n, i in enumerate(rng.sample(range(len(players)), int(len(players) * rate))):
+        players[i] = synthetic_player(next_id + n, identifiers)
+    resources = list(data["resources"])
+    for n, i in enumerate(rng.sample(range(len(resources)), int(len(resources) * rate))):
+        resources[i] = f"resource_{len(resources) + seed * len(resources) + n}"
+    data.update(players=players, resources=resources)
+    return dict(response, Data=data)
@@ -1,22 +1,48 @@
 import asyncio
-import json
+import io
 import os
-import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from os import path
 from os import stat as os_stat
 from pprint import pformat, pprint
 from stat import ST_MTIME
-from time import time
+from time import time, monotonic, perf_counter
 from pathlib import Path
-from typing import Optional, Any, List, TypeVar, Type, Callable, cast
+from typing import Optional, Any, List, TypeVar, Type, Callable, Union, cast
 
 import aiohttp
 import discord
 
-from Classes.Player import Player, PlayerDB
+from Classes.History import SnapshotHistory
+from Classes.Dispatcher import Dispatcher
+from Classes.Http import Http, create_session
+from Classes.Metrics import REGISTRY, SIZE_BUCKETS, serve as serve_metrics
+from Classes.NameIndex import normalize
+from Classes.Player import PlayerDB
+from Classes.Profiler import PROFILES, Profile
+from Classes.Poller import API_URL, BULK_URL, PollResult, Poller
+from Classes.Policy import IntervalPolicy
+from Classes.Registry import CONFIG_FIELDS, ServerRegistry
+from Classes.Replay import Recorder
+from Classes.Scheduler import PollScheduler
+from Classes.SQLitePlayerDB import SQLitePlayerDB
 from Classes.Server import Server
-from Classes.fivem.ServerResponseSingle import server_response_single_from_dict, ServerResponseSingle
+from Classes.SnapshotCache import SnapshotCache
+from Classes.TimeSeries import TimeSeries
+from Classes.Utils import log, sanitize
+from Classes.Worker import WorkerPool, WorkerSettings
+from Classes.Writer import WriteBehind
+from Classes.fivem.ServerResponseSingle import Data, ServerResponseSingle
+from Classes.fivem.ServerResponseSingle import Player as ServerPlayer
+
+
+POLLS = REGISTRY.counter("erp_polls_total", "Polls by outcome: error, unchanged or changed", ("server", "outcome"))
+POLL_STAGE_SECONDS = REGISTRY.histogram("erp_poll_stage_seconds", "Time spent in each stage of a poll",
+                                        ("server", "stage"))
+RESPONSE_BYTES = REGISTRY.histogram("erp_response_bytes", "Size of server responses", ("server",), SIZE_BUCKETS)
+PLAYERS = REGISTRY.gauge("erp_players", "Players online at the last changed poll", ("server",))
+CAPACITY = REGISTRY.gauge("erp_capacity", "Player slots at the last changed poll", ("server",))
+PLAYERDB_SAVE_SECONDS = REGISTRY.histogram("erp_playerdb_save_seconds", "Time PlayerDB.save blocked the event loop")
 
 
 def modification_date(filename) -> datetime:
@@ -33,107 +59,341 @@ def embed_not_empty(embed) -> bool:
             embed.fields is not discord.Embed.Empty)
 
 
-def cacheFile(id) -> str:
-    return f"cache/{id}.cache.json"
-
-
-def sanitize(input: str) -> str:
-    # log(f"Sanitizing {input}", False, True)
-    return re.sub(r"\^\d", "", input.strip(), 0, re.MULTILINE)
-
-
 def cut(input: str) -> str:
     if input is None: return input
     return input[:2000]
 
 
-def log(message, pretty=False, debug=False):
-    if debug: return
-    if message is str and pretty: message = pformat(message)
-    print(f"[{datetime.now()}] {message}")
-
-
-def getDiff(old, new) -> Optional[str]:
-    missing = (set(old).difference(new))
-    is_missing = len(missing) > 0
-    added = (set(new).difference(old))
-    is_added = len(added) > 0
-    if is_missing or is_added:
-        i = ["```diff"]
-        if is_missing: i.append("- " + '\n- '.join(sorted(missing, key=str.lower)))
-        if is_added:   i.append("+ " + '\n+ '.join(sorted(added, key=str.lower)))
-        i.append("```")
-        return '\n'.join(i)
-    return None
-
-
-def getPlayerDiff(old, new) -> Optional[str]:
-    missing = (set(old).difference(new))
-    is_missing = len(missing) > 0
-    added = (set(new).difference(old))
-    is_added = len(added) > 0
-    if is_missing or is_added:
-        i = ["```diff"]
-        if is_missing: i.append("- " + '\n- '.join(getPlayers(missing)))
-        if is_added:   i.append("+ " + '\n+ '.join(getPlayers(added)))
-        i.append("```")
-        return '\n'.join(i)
-    return None
-
-
-def getPlayers(players) -> List[str]:
-    return sorted([f"#{o.id} \"{sanitize(o.name)}\" ({o.ping}ms)" for o in players])
-
-
 class MyClient(discord.Client):
-    api_url = "https://servers-frontend.fivem.net/api/servers/single/"
-    servers: List[Server]
+    api_url = API_URL
+    bulk_url = BULK_URL
+    bulkIngest = False  # read tracked servers from the bulk server list instead of one request each
+    bulkInterval = 60
+    serversFile = "servers.json"
+    serversCheckInterval = 5  # seconds between checks whether serversFile changed, 0 to only reload on !reload
+    registry: ServerRegistry
     webclient: aiohttp.ClientSession
+    http: Http
+    httpPoolLimit = 100
+    httpPoolLimitPerHost = 16
+    httpDNSCacheTTL = 300
+    httpConnectTimeout = 5
+    httpReadTimeout = 15
+    httpRetries = 2
+    httpBackoff = 0.5  # seconds before the first retry, doubled for each one after
     min_cache_time = 15
     playersDBFile = "cache/players.db.json"
-    playersDB: PlayerDB
+    playersDBJournaled = True
+    playersDBBackend = "json"  # or "sqlite"
+    playersDBSQLiteFile = "cache/players.db.sqlite"
+    playersDB: Union[PlayerDB, SQLitePlayerDB, None]  # None until loaded, see players()
+    playersDBLoading: asyncio.Task
+    playersDBLoadTime: Optional[float] = None
+    playersDBError: Optional[str] = None  # why the last load failed, players aren't recorded meanwhile
+    poll_concurrency = 8
+    pollerWorkers = 0  # poll in this many worker processes instead of the bot's, see Classes/Worker.py
+    adaptivePolling = True  # adapt intervals to each server's activity, see Classes/Policy.py
+    # Polls per second for all servers together, split evenly between workers. None allows as many as the
+    # configured intervals add up to; a fixed budget stretches every interval once the servers need more.
+    pollBudget: Optional[float] = None
+    workers: Optional[WorkerPool] = None
+    poller: Poller
+    main_task: Optional[asyncio.Task] = None
+    lazyResponses = True  # decode response fields on first access instead of all at once
+    scheduler: PollScheduler
+    snapshots: SnapshotCache
+    writer: WriteBehind
+    history: SnapshotHistory
+    timeseries: TimeSeries
+    dispatcher: Dispatcher
+    historyKeyframeEvery = 60
+    maxManualSnapshots = 32
+    metricsHost = "127.0.0.1"
+    metricsPort = 9108  # Prometheus endpoint at /metrics, 0 to turn it off
+    metricsRunner = None
+    recordFile: Optional[str] = None  # record every response here for tools/replay.py, per worker with workers
+    admins: List[int] = []  # user ids allowed to run admin commands, besides the guild's administrators
+    profile: Optional[Profile] = None
+    profileRequest: Optional[discord.Message] = None
 
     def __init__(self, **options):
         super().__init__(**options)
-        self.servers = list()
-        self.servers.append(Server("ykv8z5", "EndlessRP", "", 847469532174876683))
-        self.servers.append(Server("l8r6jj", "EndlessRP Test", "", 849809046453485618))
-        self.servers.append(Server("vkj37r", "Drift Fantasy", "", 849812243042533376, True))
-        self.servers.append(Server("8abjev", "BluTest_8abjev", "", 850822912347734077))
-        self.servers.append(Server("3b9plz", "BluTest_3b9plz", "", 850822912347734077))
-        self.servers.append(Server("6v9zdj", "BluTest_6v9zdj", "", 850822912347734077))
-        self.playersDB = PlayerDB(self.playersDBFile)
+        self.registry = ServerRegistry(self.serversFile)
+        Path("cache/").mkdir(parents=True, exist_ok=True)
+        self.writer = WriteBehind()
+        self.timeseries = TimeSeries()
+        self.dispatcher = Dispatcher()
+        self.history = SnapshotHistory("cache/history", self.historyKeyframeEvery, self.writer)
+        self.playersDB = None
+        self.sightings = list()  # (server, player, time) seen before the PlayerDB finished loading
+        self.snapshots = SnapshotCache(self.maxManualSnapshots)
+        self.poller = Poller(self.publish, self.snapshots, self.history, self.writer, self.isTracked,
+                             self.lazyResponses, self.api_url, self.bulk_url)
+        if self.adaptivePolling: self.poller.policy = IntervalPolicy(self.pollBudget)
+        self.scheduler = PollScheduler(self.poller.check, self.poll_concurrency, self.poller.on_timeout)
+        REGISTRY.gauge("erp_servers", "Servers in the registry", function=lambda: len(self.registry))
+        REGISTRY.gauge("erp_poll_interval_seconds", "Seconds between polls of each server", ("server",),
+                       function=lambda: {s.id: s.poll_interval for s in self.servers})
+        REGISTRY.gauge("erp_poll_behind_seconds", "How far each server's polls are behind schedule", ("server",),
+                       function=lambda: self.scheduler.status())
+        REGISTRY.gauge("erp_playerdb_players", "Players in the PlayerDB",
+                       function=lambda: len(self.playersDB) if self.playersDB is not None else 0)
+        REGISTRY.gauge("erp_discord_queue_depth", "Messages and topic edits waiting to be sent",
+                       function=lambda: self.dispatcher.depth)
+        REGISTRY.gauge("erp_write_queue_depth", "Files waiting to be written", function=lambda: self.writer.depth)
+        REGISTRY.gauge("erp_write_latency_seconds", "Time from queueing the last write to it hitting the disk",
+                       function=lambda: self.writer.last_latency)
+
+    async def setup_hook(self):
+        # Loaded in the background so the gateway connects right away
+        self.playersDBLoading = asyncio.create_task(self.load_players())
+        if self.metricsPort:
+            self.metricsRunner = await serve_metrics(REGISTRY, self.metricsHost, self.metricsPort)
+
+    async def load_players(self) -> Union[PlayerDB, SQLitePlayerDB, None]:
+        started = monotonic()
+        try:
+            if self.playersDBBackend == "sqlite":
+                # Opening may index the names of an older DB for searching or migrate the JSON one, which
+                # takes a while on a large one
+                db = await asyncio.to_thread(self.open_sqlite_players)
+            else:
+                db = await asyncio.to_thread(PlayerDB, self.playersDBFile, self.playersDBJournaled, writer=self.writer)
+        except Exception as ex:
+            # Nothing is saved without a DB, so the file is left as it is. players() tries again.
+            self.playersDBError = repr(ex)
+            self.sightings.clear()
+            log(f"Failed to load the PlayerDB, players aren't recorded until it loads: {ex!r}")
+            return None
+        for server, player, timestamp in self.sightings:
+            try:
+                db.updatePlayer(server, player, timestamp)
+            except Exception:
+                pass
+        if self.sightings: db.save()
+        self.sightings.clear()
+        self.playersDB = db
+        self.playersDBLoadTime = monotonic() - started
+        log(f"PlayerDB ready after {self.playersDBLoadTime:.2f}s")
+        return db
+
+    def open_sqlite_players(self) -> SQLitePlayerDB:
+        """Opens the SQLite PlayerDB. While it is empty, the players of the JSON PlayerDB are copied over
+        first, if there is one, so switching playersDBBackend keeps them."""
+        db = SQLitePlayerDB(self.playersDBSQLiteFile)
+        if len(db) == 0 and path.isfile(self.playersDBFile):
+            db.migrate(PlayerDB(self.playersDBFile, self.playersDBJournaled))
+        return db
+
+    async def players(self) -> Union[PlayerDB, SQLitePlayerDB, None]:
+        """The PlayerDB, waiting for it to finish loading first if needed. None if loading failed, see
+        playersDBError; the next call tries again."""
+        if self.playersDBError is not None and self.playersDBLoading.done():
+            self.playersDBError = None
+            self.playersDBLoading = asyncio.create_task(self.load_players())
+        return await asyncio.shield(self.playersDBLoading)
+
+    @property
+    def servers(self) -> List[Server]:
+        return self.registry.servers
 
     async def on_ready(self):
-        self.webclient = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
-        log(f"[AIOHTTP] Client created. {self.webclient.timeout}")
         log(f'[DISCORD] Logged on as {self.user} ({self.user.id})')
+        if self.main_task is not None: return  # reconnected, everything is running already
+        self.webclient = create_session(**self.session_settings())
+        self.http = Http(self.webclient, self.httpRetries, self.httpBackoff)
+        self.poller.http = self.http
+        if self.recordFile: self.poller.recorder = Recorder(self.recordFile, self.writer)
+        log(f"[AIOHTTP] Client created. {self.webclient.timeout}")
         for server in self.servers:
-            server.channel = self.get_channel(server.channel)
-        client.loop.create_task(self.main_loop())
+            self.resolve_channel(server)
+        self.main_task = asyncio.create_task(self.main_loop())
+        if self.serversCheckInterval > 0: asyncio.create_task(self.watch_servers())
+
+    def resolve_channel(self, server: Server) -> None:
+        if isinstance(server.channel, int): server.channel = self.get_channel(server.channel)
+
+    async def watch_servers(self):
+        while True:
+            await asyncio.sleep(self.serversCheckInterval)
+            try:
+                if self.registry.changed_on_disk(): await self.reload_servers()
+            except Exception as ex:
+                log(f"Failed to reload \"{self.serversFile}\": {ex!r}")
+
+    async def reload_servers(self) -> str:
+        """Applies changes to serversFile without a restart. Servers that are still listed keep their state,
+        removed ones stop being polled and their snapshot is kept like a manually queried one."""
+        entries, mtime = await asyncio.to_thread(self.registry.read)
+        added, removed, changed = self.registry.apply(entries, mtime)
+        for server in added + changed:
+            self.resolve_channel(server)
+        polling = self.main_task is not None and not self.bulkIngest  # bulk mode reads self.servers each round
+        for server in removed:
+            self.snapshots.untrack(server.id)
+            REGISTRY.remove("server", server.id)
+            if self.poller.policy is not None: self.poller.policy.forget(server.id)
+            if self.workers is not None:
+                self.workers.send(server.id, "remove")
+            elif polling:
+                self.scheduler.remove(server)
+        for server in added:
+            if self.workers is not None:
+                self.workers.add(server)
+            elif polling:
+                self.scheduler.schedule(server, monotonic())
+        if self.workers is not None:
+            for server in changed:
+                self.workers.send(server.id, "update", {name: getattr(server, name) for name in CONFIG_FIELDS
+                                                        if name != "channel"})
+        summary = f"{len(added)} added, {len(removed)} removed, {len(changed)} changed, {len(self.registry)} servers"
+        log(f"Reloaded \"{self.serversFile}\": {summary}")
+        return summary
+
+    def session_settings(self) -> dict:
+        return {"limit": self.httpPoolLimit, "limit_per_host": self.httpPoolLimitPerHost,
+                "dns_ttl": self.httpDNSCacheTTL, "connect_timeout": self.httpConnectTimeout,
+                "read_timeout": self.httpReadTimeout}
+
+    def worker_settings(self) -> WorkerSettings:
+        return WorkerSettings(self.api_url, self.lazyResponses, self.poll_concurrency, self.history.directory,
+                              self.historyKeyframeEvery, self.maxManualSnapshots, self.session_settings(),
+                              self.httpRetries, self.httpBackoff, self.recordFile, self.adaptivePolling,
+                              self.pollBudget / self.pollerWorkers if self.pollBudget is not None else None)
+
+    async def close(self):
+        if self.workers is not None: await asyncio.to_thread(self.workers.stop)
+        await self.dispatcher.flush()
+        if self.playersDB is not None: self.playersDB.save()
+        await asyncio.to_thread(self.writer.close)
+        if self.metricsRunner is not None: await self.metricsRunner.cleanup()
+        await super().close()
 
     async def on_message(self, message: discord.Message):
         cmd = message.content.split(" ")
-        server = self.servers[0]
-        for _server in self.servers:
-            if _server.channel.id == message.channel.id:
-                server = _server
-        if len(cmd) == 2: server = Server(cmd[1], f"manual input ({cmd[1]})", "", message.channel)
+        in_channel = self.registry.in_channel(message.channel.id)
+        server = in_channel[-1] if in_channel else self.servers[0] if self.servers else None
+        # !history and !pin take a server id before their argument, the rest take it as their only one
+        if (len(cmd) == 2 and cmd[0] not in ("!history", "!pin")) or (len(cmd) == 3 and cmd[0] in ("!history", "!pin")):
+            server = self.registry.get(cmd[1]) or Server(cmd[1], f"manual input ({cmd[1]})", "", message.channel)
+        if server is None and cmd[0] not in ("!ping", "!profile", "!reload", "!io", "!schedule", "!player"):
+            return  # serversFile lists no servers and no id was given, only commands that need no server work
         if cmd[0] == "!ping":
             await self.reply(message, "pong")
+        elif cmd[0] == "!profile":
+            if not self.is_admin(message):
+                await self.reply(message, content="Only admins can profile the bot")
+            elif len(cmd) > 1 and cmd[1] == "stop":
+                if self.profile is None:
+                    await self.reply(message, content="No profile is running")
+                else:
+                    await self.finish_profile()
+            elif self.profile is not None:
+                await self.reply(message, content=f"A {self.profile.kind} profile is running already, "
+                                                  f"{self.profile.seen} of {self.profile.polls} polls done")
+            elif len(cmd) > 1 and cmd[1] not in PROFILES:
+                await self.reply(message, content=f"Usage: !profile [{'|'.join(PROFILES)}] [rounds] or !profile stop")
+            else:
+                rounds = int(cmd[2]) if len(cmd) > 2 and cmd[2].isdigit() else 1
+                polls = rounds * max(1, sum(not s.disabled for s in self.servers))
+                self.profile = PROFILES[cmd[1] if len(cmd) > 1 else "cpu"](polls)
+                self.profileRequest = message
+                self.profile.start()
+                await self.reply(message, content=f"{self.profile.kind} profile started for {rounds} round(s), "
+                                                  f"{polls} polls" +
+                                                  (". Polls run in worker processes, only publishing them is profiled"
+                                                   if self.workers is not None else ""))
         elif cmd[0] == "!server":
-            await self.check_5mserver(server)
+            if self.workers is not None and self.isTracked(server.id):
+                self.workers.send(server.id, "poll")
+            else:
+                await self.poller.check(server)
         elif cmd[0] == "!toggle":
             server.disabled = not server.disabled
+            if self.workers is not None: self.workers.send(server.id, "toggle", server.disabled)
+            if server.disabled and self.poller.policy is not None: self.poller.policy.forget(server.id)
             status = "disabled" if server.disabled else "enabled"
             await self.reply(message, content=f"{server.name} is now {status}")
+        elif cmd[0] == "!pin" and len(cmd) > 1:
+            if cmd[-1] == "off":
+                server.pinned_interval = 0
+            else:
+                try:
+                    interval = float(cmd[-1])
+                except ValueError:
+                    interval = 0
+                if interval < 1:
+                    await self.reply(message, content="Usage: !pin [server id] <seconds|off>")
+                    return
+                server.pinned_interval = interval
+            if self.workers is not None:
+                self.workers.send(server.id, "update", {"pinned_interval": server.pinned_interval})
+            elif self.main_task is not None and not self.bulkIngest and server.id in self.registry:
+                self.scheduler.reschedule(server)
+            status = f"pinned to every {server.pinned_interval:g}s" if server.pinned_interval else \
+                f"unpinned, back to its configured interval of {server.interval:g}s"
+            await self.reply(message, content=f"{server.name} is now {status}")
+        elif cmd[0] == "!reload":
+            try:
+                summary = await self.reload_servers()
+            except Exception as ex:
+                summary = f"Failed to reload \"{self.serversFile}\": {ex!r}"
+            await self.reply(message, content=summary)
         elif cmd[0] == "!servers":
             # log(self.servers, True, True)
-            await self.servers[0].channel.send(pformat(self.servers))
+            channel = self.servers[0].channel if self.servers else message.channel
+            await channel.send(cut(pformat(self.servers)))
             await self.main_loop(True)
+        elif cmd[0] == "!history" and len(cmd) > 1:
+            try:
+                when = datetime.now() - timedelta(minutes=float(cmd[-1]))
+            except (ValueError, OverflowError):
+                await self.reply(message, content="Usage: !history [server id] <minutes ago>")
+                return
+            state = await asyncio.to_thread(self.history.at, server.id, when)
+            if state is None:
+                await self.reply(message, content=f"No history for {server.name} at {when}")
+                return
+            players = sorted(sanitize(p[0] or "") for p in state["p"].values())
+            await self.reply(message, content=f"**{sanitize(state['f']['hostname'] or '')}** at {when}\n"
+                                              f"[{len(players)} / {state['f']['sv_maxclients']}] "
+                                              f"{len(state['r'])} resources, "
+                                              f"build {state['v'].get('sv_enforceGameBuild')}\n"
+                                              f"```\n{', '.join(players)}\n```")
+        elif cmd[0] == "!stats":
+            minutes = float(cmd[1]) if len(cmd) > 1 and cmd[1].replace(".", "", 1).isdigit() else 60
+            resolution, rows = self.timeseries.query(server.id, datetime.now() - timedelta(minutes=minutes))
+            if not rows:
+                await self.reply(message, content=f"No stats for {server.name} in the last {minutes:g} minutes")
+                return
+            players = [r.get("players", r.get("players_avg")) for r in rows]
+            pings = [r["ping_avg"] for r in rows]
+            await self.reply(message, content=f"**{server.name}**, last {minutes:g} minutes "
+                                              f"({len(rows)} {resolution} samples)\n"
+                                              f"Players: min {min(players):.0f} / "
+                                              f"avg {sum(players) / len(players):.1f} / "
+                                              f"max {max(players):.0f} of {rows[-1]['capacity']}\n"
+                                              f"Ping: avg {sum(pings) / len(pings):.0f}ms / "
+                                              f"max {max(r['ping_max'] for r in rows):.0f}ms")
+        elif cmd[0] == "!io":
+            load = f"{self.playersDBLoadTime:.2f}s" if self.playersDBLoadTime is not None else \
+                f"failed, {self.playersDBError}" if self.playersDBError is not None else "still loading"
+            await self.reply(message, content="```\nwrites: " + pformat(self.writer.stats()) +
+                                              "\ndiscord: " + pformat(self.dispatcher.stats()) +
+                                              f"\nplayers db: {load}" +
+                                              (f"\nworkers: {self.workers.alive()} / {self.workers.count} alive"
+                                               if self.workers is not None else "") + "\n```")
+        elif cmd[0] == "!schedule":
+            lines = [f"{s.id} {s.name}: every {s.poll_interval:.0f}s (" +
+                     ("pinned by !pin" if s.pinned_interval else "pinned" if s.pinned else
+                      f"adaptive, configured {s.interval:g}s") +
+                     f"), {self.scheduler.behind(s):.1f}s behind, "
+                     f"{s.fingerprint_hits} unchanged / {s.fingerprint_misses} changed, last poll {s.last_poll}, "
+                     f"breaker {s.breaker}" + (f", error: {s.error}" if s.error else "")
+                     for s in self.servers]
+            await self.reply(message, content="```\n" + "\n".join(lines) + "\n```")
         elif cmd[0] == "!players":
-            cache = self.get_Cache(cacheFile(server.id))
-            if not cache: cache = await self.get_Server(server.id)
+            cache = await self.snapshot(server.id)
             embed = discord.Embed()
             embed.colour = discord.Colour.green()
             embed.title = f"Players [{len(cache.data.players)} / {cache.data.sv_maxclients}]"
@@ -141,151 +401,162 @@ class MyClient(discord.Client):
                 embed.add_field(name=f"{player.name} (#{player.id})", value=f"{player.ping}ms")
             await self.reply(message, embed=embed)
         elif cmd[0] == "!player" and len(cmd) > 1:
-            name = " ".join(cmd.pop(0))
-            await self.reply(message, content="```json\n" + json.dumps(
-                Player.to_dict(self.playersDB.getByName(name)[0])) + "\n```")
+            query = " ".join(cmd[1:])
+            db = await self.players()
+            if db is None:
+                await self.reply(message, content=f"The PlayerDB couldn't be loaded: {self.playersDBError}")
+                return
+            matches = db.searchNames(query)
+            if not matches:
+                await self.reply(message, content=f"No players found for \"{query}\"")
+                return
+            lines = list()
+            for i, (score, key, player) in enumerate(matches, 1):
+                seen_on = player.lastSeenOn()
+                names = [n for s in player.seen_on or [] for n in s.names or [] if normalize(n.name or "") == key]
+                name = max(names, key=lambda n: n.seen or 0).name if names else key
+                where = sanitize(seen_on.server.name or seen_on.server.id or '') if seen_on else ""
+                lines.append(f"{i}. {sanitize(name)}" +
+                             (f" - {where}, last seen {seen_on.last_seen}" if seen_on else ""))
+            await self.reply(message, content=f"Players matching \"{query}\"\n```\n" + "\n".join(lines) + "\n```")
         elif cmd[0] == "!resources":
-            cache = self.get_Cache(cacheFile(server.id))
-            if not cache: cache = await self.get_Server(server.id)
+            cache = await self.snapshot(server.id)
             await self.reply(message, content="```css\n" + (sanitize(",".join(cache.data.resources)) + "\n```"))
 
     async def main_loop(self, destroy=False):
         log(f"Checking {len(self.servers)} servers...")
-        while True:
-            for s in self.servers:
-                if s.disabled:
-                    log(f"Server \"{s.name}\" ({s.id}) is disabled, skipping...")
+        if destroy:
+            if self.workers is not None:
+                for server in self.servers: self.workers.send(server.id, "poll")
+                return
+            await self.scheduler.run_once(self.servers)
+            return
+        if self.bulkIngest:
+            # One stream covers every server, so this always runs in the bot process
+            await self.poller.bulk_loop(lambda: self.servers, self.bulkInterval)
+            return
+        if self.pollerWorkers > 0:
+            self.workers = WorkerPool(self.pollerWorkers, self.worker_settings())
+            self.workers.start(self.servers)
+            while True:
+                result = await self.workers.receive()
+                server = self.registry.get(result.sid)
+                if server is None: continue
+                try:
+                    await self.publish(server, result)
+                except Exception as ex:
+                    # One bad result mustn't stop publishing the others, the workers keep polling regardless
+                    log(f"Publishing a poll of \"{server.name}\" ({server.id}) failed: {ex!r}")
+        else:
+            self.scheduler.add(self.servers)
+            await self.scheduler.run()
+
+    async def publish(self, server: Server, result: PollResult):
+        """Acts on what a poll found: records it, reports changes and errors and updates the topic. Results
+        come from the bot's own Poller or from the worker processes."""
+        if self.profile is not None and self.profile.tick(): asyncio.create_task(self.finish_profile())
+        if result.interval: server.adaptive_interval = result.interval  # chosen by a worker's policy
+        for stage, seconds in result.timings.items():
+            POLL_STAGE_SECONDS.labels(server.id, stage).observe(seconds)
+        if result.size: RESPONSE_BYTES.labels(server.id).observe(result.size)
+        if result.error is not None:
+            POLLS.labels(server.id, "error").inc()
+            await self.fail(server, result.error, result.timestamp, result.notify)
+            return
+        POLLS.labels(server.id, "unchanged" if result.hostname is None else "changed").inc()
+        server.error = ""
+        server.last_poll = result.timestamp
+        if result.sample is None:
+            self.timeseries.repeat(server.id, result.timestamp)
+        else:
+            self.timeseries.record(server.id, result.timestamp, *result.sample)
+        if result.hostname is None: return
+        PLAYERS.labels(server.id).set(result.players)
+        CAPACITY.labels(server.id).set(result.capacity)
+        if result.changes:
+            embed = discord.Embed()
+            for name, value, inline in result.fields:
+                embed.add_field(name=name, value=value, inline=inline)
+            embed.title = "Changes Detected!"
+            embed.description = f"fivem://connect/{server.id}"
+            embed.url = f"https://servers.fivem.net/servers/detail/{server.id}"
+            embed.colour = discord.Colour.orange()
+            embed.timestamp = result.timestamp
+            await self.send_message(server, result.hostname, message="**Changes**: " + ", ".join(result.changes),
+                                    embed=embed)
+        if result.sightings:
+            fivem_server = ServerResponseSingle(server.id, Data(hostname=result.hostname))
+            started = perf_counter()
+            for player in result.sightings:
+                player = ServerPlayer.from_dict(player)
+                if self.playersDB is None:
+                    # Kept for when it's loaded, unless loading failed
+                    if self.playersDBError is None: self.sightings.append((fivem_server, player, result.timestamp))
                     continue
-                log("Waiting 5 seconds for next server ...")
-                await asyncio.sleep(5)
-                log(f"Checking server \"{s.name}\" ({s.id})")
-                await self.check_5mserver(s)
-            if destroy: break
-            log("Waiting 55 seconds for next round ...")
-            await asyncio.sleep(55)
-
-    async def send_message(self, _server: Server, server: ServerResponseSingle, message: str = None,
-                           embed: discord.Embed = None):
+                try:
+                    self.playersDB.updatePlayer(fivem_server, player, result.timestamp)
+                except Exception as ex:
+                    pass  # await self.fail(server, f"Failed to index players for \"{server.name}\" ({server.id}): {str(ex)}", now)
+            POLL_STAGE_SECONDS.labels(server.id, "playerdb").observe(perf_counter() - started)
+            if self.playersDB is not None:
+                started = perf_counter()
+                self.playersDB.save()
+                PLAYERDB_SAVE_SECONDS.observe(perf_counter() - started)
+        self.update_topic(server, result.players, result.capacity, result.hostname, result.timestamp)
+
+    def is_admin(self, message: discord.Message) -> bool:
+        permissions = getattr(message.author, "guild_permissions", None)
+        return message.author.id in self.admins or (permissions is not None and permissions.administrator)
+
+    async def finish_profile(self):
+        profile, request = self.profile, self.profileRequest
+        if profile is None: return
+        self.profile = self.profileRequest = None
+        report = await asyncio.to_thread(profile.stop)
+        await request.reply(content=profile.header(), file=discord.File(io.BytesIO(report.encode('utf-8')),
+                                                                        filename=f"profile-{profile.kind.lower()}.txt"))
+
+    async def send_message(self, server: Server, hostname: str, message: str = None, embed: discord.Embed = None):
         if not embed: embed = discord.Embed()
-        if not embed.footer: embed.set_footer(text=sanitize(server.data.hostname))
+        if not embed.footer: embed.set_footer(text=sanitize(hostname))
         if not embed.timestamp: embed.timestamp = datetime.now()
         if not embed.color: embed.colour = discord.Colour.orange()
         log(embed, pretty=True, debug=True)
         if message: message += " ||<@&849813983434113076>||"
-        await _server.channel.send(content=cut(message), embed=embed)
+        self.dispatcher.send(server.channel, content=cut(message), embed=embed)
 
     async def reply(self, original_message: discord.Message, content: str = None, embed: discord.Embed = None):
         await original_message.reply(content=cut(content), embed=embed)
 
-    def get_Cache(self, cfile: str):
-        if path.isfile(cfile):
-            """
-            cache_age = file_age_in_seconds(cfile)
-            if cache_age < self.min_cache_time:
-                log(f"{cfile} too new ({math.floor(cache_age)}s / {self.min_cache_time}s)")
-                return
-            """
-            log(f"Using {cfile}")
-            return server_response_single_from_dict(self.load_response(cfile))
-        else:
-            Path("cache/").mkdir(parents=True, exist_ok=True)
-            return None
-
-    async def get_Server(self, sid):
-        cfile = cacheFile(sid)
-        url = self.api_url + sid
-        async with self.webclient.get(url) as response:
-            _json = await response.json()
-            log(_json, debug=True)
-            self.save_response(_json, cfile)
-            return server_response_single_from_dict(_json)
-
-    async def check_5mserver(self, server):
-        try:
-            cfile = cacheFile(server.id)
-            last_response = self.get_Cache(cfile)
-            url = self.api_url + server.id
-            log("[AIOHTTP] Requesting " + url)
-            now = datetime.now()
-            async with self.webclient.get(url) as response:
-                log(response, pretty=True, debug=True)
-                if response.status != 200:
-                    await self.fail(server,
-                                    f"Failed to request data for \"{server.name}\" ({server.id}): HTTP ERROR {response.status}",
-                                    now)
-                    return
-                _json = await response.json()
-                log(_json, pretty=False, debug=True)
-                self.save_response(_json, cfile)
-                if last_response is None: return
-                fivem_server = server_response_single_from_dict(_json)
-                log(fivem_server, pretty=True, debug=True)
-                server.error = ""
-                embed = discord.Embed()
-                changes = []
-                # CHANGES START
-                if fivem_server.data.resources != last_response.data.resources:
-                    embed.add_field(name="Resources",
-                                    value=getDiff(last_response.data.resources, fivem_server.data.resources).replace(
-                                        "%20", " "))
-                    changes.append("resources")
-                if fivem_server.data.vars.sv_enforce_game_build != last_response.data.vars.sv_enforce_game_build:
-                    embed.add_field(name="Game Version",
-                                    value=f"```diff\n-{last_response.data.vars.sv_enforce_game_build}\n+{fivem_server.data.vars.sv_enforce_game_build}```")
-                    changes.append("game version")
-                if fivem_server.data.players != last_response.data.players:
-                    embed.add_field(name="Players",
-                                    value=getPlayerDiff(last_response.data.players, fivem_server.data.players),
-                                    inline=False)
-                    changes.append("players")
-                # CHANGES END
-                if changes:
-                    embed.title = "Changes Detected!"
-                    embed.description = f"fivem://connect/{server.id}"
-                    embed.url = f"https://servers.fivem.net/servers/detail/{server.id}"
-                    embed.colour = discord.Colour.orange()
-                    embed.timestamp = now
-                    await self.send_message(server, fivem_server, message="**Changes**: " + ", ".join(changes),
-                                            embed=embed)
-                    for player in fivem_server.data.players:
-                        try:
-                            self.playersDB.updatePlayer(fivem_server, player)
-                        except Exception as ex:
-                            pass  # await self.fail(server, f"Failed to index players for \"{server.name}\" ({server.id}): {str(ex)}", now)
-                    self.playersDB.save()
-                asyncio.get_event_loop().create_task(self.update_topic(server, fivem_server, now))
+    async def snapshot(self, sid: str) -> ServerResponseSingle:
+        """Latest response for !players and !resources. Worker processes keep their snapshots to themselves,
+        so with workers it is fetched."""
+        if self.workers is None:
+            snapshot = await self.poller.get_Cache(sid)
+            if snapshot: return snapshot
+        return await self.poller.get_Server(sid)
 
+    def isTracked(self, sid: str) -> bool:
+        return sid in self.registry
 
-
-        except Exception as ex:
-            await self.fail(server, f"Failed to request data for \"{server.name}\" ({server.id}): {ex.args}", now)
-
-    async def update_topic(self, server: Server, _server: ServerResponseSingle, timestamp):
-        newtopic = f"[{len(_server.data.players)} / {_server.data.sv_maxclients}] {sanitize(_server.data.hostname)}"
+    def update_topic(self, server: Server, players: int, capacity: int, hostname: str, timestamp):
+        newtopic = f"[{players} / {capacity}] {sanitize(hostname)}"
         if server.channel.topic is None or not server.channel.topic.startswith(newtopic):
             log(f"Settings channel topic of {server.channel.name} to \"{newtopic}\"", False, False)
-            await server.channel.edit(topic=newtopic+f"\nLast Updated: {timestamp}")
-
-    def load_response(self, filename):
-        if not path.isfile(filename): self.save_response({}, filename)
-        with open(filename, 'r', encoding='utf-8') as f:
-            _json = json.load(f)
-        return _json
-
-    def save_response(self, _json, filename):
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(_json, f, ensure_ascii=False, indent=4)
+            self.dispatcher.edit_topic(server.channel, newtopic + f"\nLast Updated: {timestamp}")
 
     def serverById(self, id):
-        return next(s for s in self.servers if s.id == id)
+        return self.registry.by_id[id]
 
     async def fail(self, server, error, timestamp, notify=False):
         log(error, True)
         if server.error == error: return
         server.error = error
-        await server.channel.send(
-            content=cut(f"```\n[{timestamp}] {error}\n```" + (" ||<@467777925790564352>||" if notify else "")))
+        self.dispatcher.send(server.channel,
+                             content=cut(f"```\n[{timestamp}] {error}\n```" + (" ||<@467777925790564352>||" if notify else "")))
 
 
-client = MyClient()
-client.run(os.environ["DISCORD_BOT_TOKEN"])
+if __name__ == "__main__":
+    # Guarded, worker processes are spawned and import this module again
+    client = MyClient()
+    client.run(os.environ["DISCORD_BOT_TOKEN"])
@@ -0,0 +1,49 @@
+# Local stand-in for servers-frontend.fivem.net that serves recorded responses.
+#
+#     python -m tools.frontend_standin [directory] [port]
+#
+# Every *.cache.json in `directory` (default: cache/) is served as
+# /api/servers/single/<id> and as one entry of the bulk stream at
+# /api/servers/streamRedir/. Point MyClient.api_url / bulk_url at it.
+
+import json
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+from Classes.fivem.ServerStream import encode_server
+
+
+def load(directory: str) -> dict:
+    responses = dict()
+    for file in sorted(Path(directory).glob("*.cache.json")):
+        with open(file, 'r', encoding='utf-8') as f:
+            _json = json.load(f)
+        if _json.get("EndPoint"): responses[_json["EndPoint"]] = _json
+    return responses
+
+
+def app(directory: str) -> web.Application:
+    async def single(request: web.Request):
+        _json = load(directory).get(request.match_info["id"])
+        if _json is None: return web.json_response({"error": "not found"}, status=404)
+        return web.json_response(_json)
+
+    async def stream(request: web.Request):
+        response = web.StreamResponse(headers={"Content-Type": "application/octet-stream"})
+        await response.prepare(request)
+        for _json in load(directory).values():
+            await response.write(encode_server(_json))
+        await response.write_eof()
+        return response
+
+    application = web.Application()
+    application.router.add_get("/api/servers/single/{id}", single)
+    application.router.add_get("/api/servers/streamRedir/", stream)
+    return application
+
+
+if __name__ == "__main__":
+    web.run_app(app(sys.argv[1] if len(sys.argv) > 1 else "cache"),
+                port=int(sys.argv[2]) if len(sys.argv) > 2 else 8080)
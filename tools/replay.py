@@ -0,0 +1,178 @@
+# Feeds recorded responses (see MyClient.recordFile and Classes/Replay.py) back through the bot's own
+# pipeline: fingerprinting, decoding, diffing, the PlayerDB and building the embeds. Discord is replaced by a
+# sink that only counts, and everything is written to a temporary directory, so nothing real is touched.
+#
+#     python -m tools.replay recording.jsonl [recording.jsonl.1 ...] [--speed X] [--players-db FILE]
+#                            [--output FILE] [--verbose]
+#
+# --speed 0 (the default) replays as fast as possible, 1 in real time, 10 ten times as fast.
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import discord
+
+from Classes.Http import CircuitBreaker
+from Classes.Replay import ReplayHttp, read_recordings
+from Classes.Server import Server
+from main import MyClient, PLAYERDB_SAVE_SECONDS, POLL_STAGE_SECONDS
+
+STAGES = ("http", "fingerprint", "parse", "record", "decode", "diff", "playerdb")
+
+
+class NullChannel:
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.name = f"replay-{id}"
+        self.topic: Optional[str] = None
+
+    def __str__(self) -> str:
+        return self.name
+
+    async def send(self, content: str = None, embeds: List[discord.Embed] = None) -> None:
+        pass
+
+    async def edit(self, topic: str = None) -> None:
+        self.topic = topic
+
+
+class NullSink:
+    """Takes the Dispatcher's place. Embeds are still serialized, as sending them would."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.embeds = 0
+        self.topics = 0
+
+    def send(self, channel: NullChannel, content: str = None, embed: discord.Embed = None) -> None:
+        self.messages += 1
+        if embed is not None:
+            embed.to_dict()
+            self.embeds += 1
+
+    def edit_topic(self, channel: NullChannel, topic: str) -> None:
+        channel.topic = topic
+        self.topics += 1
+
+    @property
+    def depth(self) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": 0, "sent": self.messages + self.topics, "merged": 0, "errors": 0}
+
+    async def flush(self, timeout: float = 10) -> None:
+        pass
+
+
+class ReplayClient(MyClient):
+    metricsPort = 0
+
+    def get_channel(self, id: int) -> NullChannel:
+        return NullChannel(id)
+
+    async def publish(self, server: Server, result):
+        started = perf_counter()
+        await super().publish(server, result)
+        self.publish_time += perf_counter() - started
+        self.publishes += 1
+
+
+def stage_totals() -> Dict[str, Dict[str, float]]:
+    totals = defaultdict(lambda: {"seconds": 0.0, "count": 0})
+    for (_, stage), buckets in POLL_STAGE_SECONDS.children.items():
+        totals[stage]["seconds"] += buckets.sum
+        totals[stage]["count"] += buckets.count
+    return dict(totals)
+
+
+async def replay(files: List[str], speed: float) -> dict:
+    client = ReplayClient(intents=discord.Intents.none())
+    client.dispatcher = sink = NullSink()
+    client.publish_time = 0.0
+    client.publishes = 0
+    if await client.load_players() is None: raise SystemExit(f"Failed to load the PlayerDB: {client.playersDBError}")
+    client.poller.http = http = ReplayHttp()
+    for server in client.servers:
+        client.resolve_channel(server)
+        # Breakers time their cooldowns on the wall clock, which a replay outruns: once open, every later
+        # record of the server would be skipped. Failures are still counted.
+        server.breaker = CircuitBreaker(threshold=float("inf"))
+    records = 0
+    first: Optional[datetime] = None
+    started = perf_counter()
+    for timestamp, sid, status, body in read_recordings(files):
+        if speed > 0:
+            first = first or timestamp
+            wait = (timestamp - first).total_seconds() / speed - (perf_counter() - started)
+            if wait > 0: await asyncio.sleep(wait)
+        http.queue(sid, status, body)
+        await client.poller.check(client.registry.get(sid), timestamp)
+        records += 1
+    events = http.requests  # the records that made it to the pipeline
+    elapsed = perf_counter() - started
+    flush_started = perf_counter()
+    await asyncio.to_thread(client.writer.close)
+    stages = stage_totals()
+    stages["publish"] = {"seconds": client.publish_time, "count": client.publishes}
+    stages["playerdb save"] = {"seconds": PLAYERDB_SAVE_SECONDS.labels().sum,
+                               "count": PLAYERDB_SAVE_SECONDS.labels().count}
+    return {"records": records, "events": events, "seconds": elapsed,
+            "events_per_second": events / elapsed if elapsed else 0.0, "flush_seconds": perf_counter() - flush_started,
+            "messages": sink.messages, "embeds": sink.embeds, "topics": sink.topics, "players": len(client.playersDB),
+            "stages": stages}
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog="python -m tools.replay")
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--speed", type=float, default=0, help="0 for as fast as possible, 1 for real time")
+    parser.add_argument("--players-db", help="start from a copy of this PlayerDB instead of an empty one")
+    parser.add_argument("--output", help="also write the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's log output")
+    args = parser.parse_args(argv)
+    files = [os.path.abspath(f) for f in args.recordings]
+    players_db = os.path.abspath(args.players_db) if args.players_db else None
+    sids = sorted({sid for _, sid, _, _ in read_recordings(files)})
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # The pipeline works relative to the working directory (cache/, servers.json)
+        os.chdir(directory)
+        try:
+            os.makedirs("cache")
+            if players_db: shutil.copy(players_db, MyClient.playersDBFile)
+            with open(MyClient.serversFile, 'w', encoding='utf-8') as f:
+                json.dump([{"id": sid, "channel": i + 1} for i, sid in enumerate(sids)], f)
+            with open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                report = asyncio.run(replay(files, args.speed))
+        finally:
+            os.chdir(cwd)
+    print(f"{report['events']} responses from {len(sids)} servers in {report['seconds']:.2f}s: "
+          f"{report['events_per_second']:.1f} per second, {report['flush_seconds']:.2f}s to flush writes")
+    if report["records"] != report["events"]:
+        print(f"{report['records'] - report['events']} of {report['records']} records were not processed")
+    print(f"{report['messages']} messages ({report['embeds']} embeds), {report['topics']} topic edits, "
+          f"{report['players']} players in the PlayerDB")
+    print(f"{'stage':<14} {'total s':>9} {'calls':>7} {'mean ms':>9} {'share':>6}")
+    for stage, total in sorted(report["stages"].items(), key=lambda s: STAGES.index(s[0]) if s[0] in STAGES else 99):
+        mean = total["seconds"] / total["count"] * 1000 if total["count"] else 0.0
+        share = total["seconds"] / report["seconds"] if report["seconds"] else 0.0
+        print(f"{stage:<14} {total['seconds']:9.3f} {total['count']:7} {mean:9.3f} {share:6.1%}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])